@@ -0,0 +1,46 @@
+"""Time `torchrecorder.record` on deep chains of elementwise ops.
+
+Each chain is a single module whose ``forward`` applies ``n_ops`` elementwise
+ops, so the autograd graph walked by `torchrecorder.recorder.op_acc` is a path
+of length ``n_ops``. The time per op should stay flat as ``n_ops`` grows.
+
+    $ python benchmarks/deep_chain.py 1000 2000 4000 8000 16000
+"""
+import sys
+import time
+import torch
+import torchrecorder
+
+
+class Chain(torch.nn.Module):
+    def __init__(self, n_ops):
+        super().__init__()
+        self.n_ops = n_ops
+
+    def forward(self, x):
+        for i in range(self.n_ops // 2):
+            x = x * 1.0001
+            x = x + 1
+        return x
+
+
+def time_record(n_ops, repeats=3):
+    net = Chain(n_ops)
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        torchrecorder.record(net, name="Chain", input_shapes=(1, 8))
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    sizes = [int(x) for x in sys.argv[1:]] or [1000, 2000, 4000, 8000, 16000]
+    print("{:>8} {:>10} {:>12}".format("n_ops", "seconds", "us/op"))
+    for n_ops in sizes:
+        t = time_record(n_ops)
+        print("{:>8} {:>10.4f} {:>12.2f}".format(n_ops, t, 1e6 * t / n_ops))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Compare the peak memory of `torchrecorder.record` with and without ``zero_copy``.
+
+The network is a stack of convolutions on large feature maps, so the copies
+made at each module boundary dominate. Every case runs in a fresh process, and
+the peak resident set size of that process is reported; on CUDA the peak of
+the caching allocator is reported as well. ``forward`` is a plain pass with
+autograd enabled, for reference.
+
+    $ python benchmarks/leaf_copies.py [n_layers] [size] [device]
+"""
+import resource
+import subprocess
+import sys
+import torch
+import torchrecorder
+
+CASES = ["forward", "copy", "zero_copy"]
+
+
+def make_net(n_layers):
+    layers = []
+    for _ in range(n_layers):
+        layers.append(torch.nn.Conv2d(16, 16, 3, padding=1))
+        layers.append(torch.nn.ReLU())
+    return torch.nn.Sequential(*layers)
+
+
+def run_case(case, n_layers, size, device):
+    net = make_net(n_layers).to(device)
+    x = torch.randn(4, 16, size, size, device=device)
+    if device == "cuda":
+        torch.cuda.reset_peak_memory_stats()
+    if case == "forward":
+        x.requires_grad = True
+        net(x)
+    else:
+        zero_copy = case == "zero_copy"
+        torchrecorder.record(
+            net, name="Net", input_shapes=None, input_data=x, zero_copy=zero_copy
+        )
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        rss *= 1024
+    cuda_peak = torch.cuda.max_memory_allocated() if device == "cuda" else 0
+    print(rss, cuda_peak)
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--case":
+        case, n_layers, size, device = sys.argv[2:]
+        run_case(case, int(n_layers), int(size), device)
+        return
+    n_layers = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 128
+    device = sys.argv[3] if len(sys.argv) > 3 else "cpu"
+    act = 4 * 16 * size * size * 4
+    print("{} layers, {:.1f} MiB per activation".format(2 * n_layers, act / 2 ** 20))
+    print("{:>10} {:>14} {:>14}".format("case", "peak RSS MiB", "peak CUDA MiB"))
+    for case in CASES:
+        args = [sys.executable, __file__, "--case", case]
+        args += [str(n_layers), str(size), device]
+        out = subprocess.run(args, stdout=subprocess.PIPE, check=True).stdout
+        rss, cuda_peak = [int(v) for v in out.split()]
+        mib = 2 ** 20
+        print("{:>10} {:>14.1f} {:>14.1f}".format(case, rss / mib, cuda_peak / mib))
+
+
+if __name__ == "__main__":
+    main()
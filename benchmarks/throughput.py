@@ -0,0 +1,203 @@
+"""Measure the wall time and peak memory of recording and rendering.
+
+`torchrecorder.record`, `torchrecorder.make_dot` and
+`torchrecorder.render_network` are run over a fixed set of CPU models, at each
+of the given render depths:
+
+* ``mlp``: a deep chain of ``Linear`` and ``ReLU`` layers
+* ``residual``: a ResNet-style stack of convolutional blocks with skip
+  connections
+* ``transformer``: a stack of pre-norm self-attention blocks
+* ``fanout``: modules whose input is split across many parallel branches,
+  which are then summed
+
+``make_dot`` is timed with an empty ``render_cache`` on every repeat, while
+``make_dot_cached`` times the same call once the cache has been filled.
+
+Every case runs in a fresh process, so the peak resident set size reported
+belongs to that case alone; ``rss_before`` is the peak before the timed stage
+(after recording, for the rendering stages). ``render_network`` needs the
+``dot`` executable, and is skipped without it. Each result is printed as a
+line of JSON, and appended to ``--out`` if given.
+
+    $ python benchmarks/throughput.py [--models mlp residual] [--depths 1 2 4]
+          [--repeats 3] [--out results.jsonl]
+"""
+import argparse
+import json
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import torch
+import torchrecorder
+
+STAGES = ["record", "make_dot", "make_dot_cached", "render_network"]
+
+
+class Residual(torch.nn.Module):
+    def __init__(self, channels):
+        super().__init__()
+        self.conv1 = torch.nn.Conv2d(channels, channels, 3, padding=1)
+        self.bn1 = torch.nn.BatchNorm2d(channels)
+        self.conv2 = torch.nn.Conv2d(channels, channels, 3, padding=1)
+        self.bn2 = torch.nn.BatchNorm2d(channels)
+
+    def forward(self, x):
+        y = torch.relu(self.bn1(self.conv1(x)))
+        return torch.relu(x + self.bn2(self.conv2(y)))
+
+
+class Block(torch.nn.Module):
+    """A pre-norm transformer encoder block, written out in plain ops."""
+
+    def __init__(self, features, heads):
+        super().__init__()
+        self.heads = heads
+        self.norm1 = torch.nn.LayerNorm(features)
+        self.qkv = torch.nn.Linear(features, 3 * features)
+        self.proj = torch.nn.Linear(features, features)
+        self.norm2 = torch.nn.LayerNorm(features)
+        self.mlp = torch.nn.Sequential(
+            torch.nn.Linear(features, 4 * features),
+            torch.nn.GELU(),
+            torch.nn.Linear(4 * features, features),
+        )
+
+    def forward(self, x):
+        b, n, f = x.shape
+        qkv = self.qkv(self.norm1(x)).reshape(b, n, 3, self.heads, f // self.heads)
+        q, k, v = qkv.permute(2, 0, 3, 1, 4)
+        att = torch.softmax(q @ k.transpose(-2, -1) / (f // self.heads) ** 0.5, -1)
+        y = (att @ v).transpose(1, 2).reshape(b, n, f)
+        x = x + self.proj(y)
+        return x + self.mlp(self.norm2(x))
+
+
+class FanOut(torch.nn.Module):
+    def __init__(self, width, features):
+        super().__init__()
+        self.branches = torch.nn.ModuleList(
+            torch.nn.Linear(features, features) for _ in range(width)
+        )
+
+    def forward(self, x):
+        y = self.branches[0](x)
+        for branch in self.branches[1:]:
+            y = y + torch.tanh(branch(x))
+        return y
+
+
+def make_model(model):
+    """The network and input shape for ``model``."""
+    if model == "mlp":
+        layers = []
+        for _ in range(64):
+            layers.append(torch.nn.Linear(64, 64))
+            layers.append(torch.nn.ReLU())
+        return torch.nn.Sequential(*layers), (8, 64)
+    if model == "residual":
+        stem = torch.nn.Conv2d(3, 16, 3, padding=1)
+        blocks = [Residual(16) for _ in range(16)]
+        return torch.nn.Sequential(stem, *blocks), (2, 3, 16, 16)
+    if model == "transformer":
+        blocks = [Block(64, 4) for _ in range(6)]
+        return torch.nn.Sequential(*blocks), (2, 16, 64)
+    if model == "fanout":
+        blocks = [FanOut(16, 32) for _ in range(8)]
+        return torch.nn.Sequential(*blocks), (4, 32)
+    raise ValueError("unknown model: {}".format(model))
+
+
+MODELS = ["mlp", "residual", "transformer", "fanout"]
+
+
+def peak_rss():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def run_case(model, stage, depth, repeats):
+    net, shape = make_model(model)
+    rec = None
+    if stage != "record":
+        rec = torchrecorder.record(net, name=model, input_shapes=shape)
+    if stage == "make_dot_cached":
+        torchrecorder.make_dot(rec, render_depth=depth)
+    rss_before = peak_rss()
+    best = float("inf")
+    with tempfile.TemporaryDirectory() as directory:
+        for _ in range(repeats):
+            if stage == "make_dot":
+                rec.render_cache.clear()
+            start = time.perf_counter()
+            if stage == "record":
+                rec = torchrecorder.record(net, name=model, input_shapes=shape)
+            elif stage in ("make_dot", "make_dot_cached"):
+                torchrecorder.make_dot(rec, render_depth=depth)
+            else:
+                torchrecorder.render_network(
+                    net, model, shape, directory, render_depth=depth
+                )
+            best = min(best, time.perf_counter() - start)
+    return dict(
+        model=model,
+        stage=stage,
+        depth=depth,
+        seconds=best,
+        rss_before=rss_before,
+        peak_rss=peak_rss(),
+        nodes=len(rec.nodes),
+        edges=len(rec.edges),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--models", nargs="+", default=MODELS, choices=MODELS)
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES)
+    parser.add_argument("--depths", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--out", help="file to append the JSON lines to")
+    parser.add_argument("--case", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.case is not None:
+        model, stage, depth = args.case
+        print(json.dumps(run_case(model, stage, int(depth), args.repeats)))
+        return
+
+    env = dict(
+        torch=torch.__version__,
+        torchrecorder=torchrecorder.__version__,
+        python=platform.python_version(),
+        machine=platform.machine(),
+    )
+    out = open(args.out, "a") if args.out else None
+    for model in args.models:
+        for stage in args.stages:
+            if stage == "render_network" and shutil.which("dot") is None:
+                print("skipping render_network: dot not found", file=sys.stderr)
+                continue
+            # recording does not depend on the depth
+            depths = args.depths[:1] if stage == "record" else args.depths
+            for depth in depths:
+                cmd = [sys.executable, __file__, "--repeats", str(args.repeats)]
+                cmd += ["--case", model, stage, str(depth)]
+                proc = subprocess.run(cmd, stdout=subprocess.PIPE, check=True)
+                result = json.loads(proc.stdout)
+                if stage == "record":
+                    result["depth"] = None
+                result.update(env)
+                line = json.dumps(result)
+                print(line)
+                if out is not None:
+                    out.write(line + "\n")
+    if out is not None:
+        out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
-from .helpers import render_network, record, make_dot
+from .helpers import render_network, record, make_dot, make_dots, write_dot
 from .renderer import GraphvizStyler
+from .batch import render_batch
 
 __version__ = "1.0.3"
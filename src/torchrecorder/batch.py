@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+    torchrecorder.batch
+    ~~~~~~~~~~~~~~
+
+    Render many recordings in parallel
+
+    :copyright: (c) 2020 by Gautham Venkatasubramanian.
+    :license: see LICENSE for more details.
+"""
+import os
+import subprocess
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .helpers import make_dots
+
+BatchResult = namedtuple(
+    "BatchResult", ["name", "render_depth", "path", "status", "seconds", "error"]
+)
+BatchResult.__doc__ = """Outcome of a single layout run by `render_batch`.
+
+Attributes:
+    name (str):         name of the network
+    render_depth (int):
+    path (str):         path of the rendered image
+    status (str):       ``"ok"``, ``"timeout"`` or ``"error"``
+    seconds (float):    wall-clock time taken by the layout
+    error (str):        ``stderr`` of the layout engine, or `None`
+"""
+
+
+def render_batch(
+    jobs,
+    directory,
+    fmt="svg",
+    engine="dot",
+    max_workers=None,
+    timeout=None,
+    progress=None,
+    styler_cls=None,
+    **styler_args
+):
+    """Render several recordings at several depths with parallel layouts.
+
+    The DOT sources are produced one recording at a time via `make_dots`;
+    each source is handed to a pool of at most ``max_workers`` layout
+    processes as soon as it is ready.
+
+    Args:
+        jobs (list(tuple)):     ``(name, rec, render_depths)`` triples, where
+                                ``rec`` is a `~torchrecorder.recorder.Recorder`
+                                and ``render_depths`` is an `int` or a `list` of `int`\ s
+        directory (str):        directory to store the rendered images
+        fmt (str, optional):    image format
+        engine (str, optional): `graphviz` layout engine to run
+        max_workers (int, optional): maximum number of concurrent layouts,
+                                defaults to the number of CPUs
+        timeout (float, optional): seconds after which a layout is killed
+        progress (optional):    a callable taking ``(result, done, total)``,
+                                called as each layout finishes
+        styler_cls:             see `make_dot`
+    Kwargs:
+        styler_args (optional): styler properties to be set for all nodes
+
+    Returns:
+        a `list` of `BatchResult`\ s, in the order of ``jobs``
+
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    os.makedirs(directory, exist_ok=True)
+
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for name, rec, render_depths in jobs:
+            if not isinstance(render_depths, (list, tuple)):
+                render_depths = [render_depths]
+            graphs = make_dots(rec, render_depths, styler_cls, **styler_args)
+            for depth, g in graphs.items():
+                g.attr(label="{} at depth = {}".format(name, depth))
+                path = os.path.join(directory, "{}-{}.{}".format(name, depth, fmt))
+                args = (name, depth, g.source, path, fmt, engine, timeout)
+                futures.append(pool.submit(_layout, *args))
+
+        for done, future in enumerate(as_completed(futures)):
+            if progress is not None:
+                progress(future.result(), done + 1, len(futures))
+    return [future.result() for future in futures]
+
+
+def _layout(name, depth, source, path, fmt, engine, timeout):
+    """Run the layout ``engine`` on ``source`` for `render_batch`."""
+    cmd = [engine, "-T" + fmt, "-o", path]
+    start = time.perf_counter()
+    try:
+        proc = subprocess.run(
+            cmd, input=source.encode("utf-8"), stderr=subprocess.PIPE, timeout=timeout
+        )
+    except subprocess.TimeoutExpired:
+        status, error = "timeout", None
+    except OSError as e:
+        status, error = "error", str(e)
+    else:
+        if proc.returncode == 0:
+            status, error = "ok", None
+        else:
+            status, error = "error", proc.stderr.decode("utf-8", "replace")
+    seconds = time.perf_counter() - start
+    return BatchResult(name, depth, path, status, seconds, error)
+
+
+def format_report(results):
+    """Tabulate the `BatchResult`\ s returned by `render_batch`.
+
+    Args:
+        results (list(`BatchResult`)):
+
+    Returns:
+        a `str` with one line per result, slowest first, and a total
+
+    """
+    lines = ["{:<32} {:>6} {:>8} {:>10}".format("name", "depth", "status", "seconds")]
+    for r in sorted(results, key=lambda r: r.seconds, reverse=True):
+        lines.append(
+            "{:<32} {:>6} {:>8} {:>10.3f}".format(
+                r.name, r.render_depth, r.status, r.seconds
+            )
+        )
+    total = sum(r.seconds for r in results)
+    lines.append("{:<32} {:>6} {:>8} {:>10.3f}".format("total", "", "", total))
+    return "\n".join(lines)
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+    torchrecorder.cache
+    ~~~~~~~~~~~~~~
+
+    On-disk cache of recordings
+
+    :copyright: (c) 2020 by Gautham Venkatasubramanian.
+    :license: see LICENSE for more details.
+"""
+import hashlib
+import inspect
+import os
+import tempfile
+from torch import get_default_dtype
+from .helpers import record
+from .serialize import dump_binary, load_binary, FORMAT_VERSION
+
+
+class RecordingCache(object):
+    """Cache recordings on disk, keyed by the structure of the network and its inputs.
+
+    Recordings are stored with `~torchrecorder.serialize.dump_binary`, one file
+    per key. When the files take up more than ``max_bytes``, the least recently
+    used ones are deleted.
+
+    Attributes:
+        directory (str):    directory containing the cached recordings
+        max_bytes (int):    size limit of ``directory``
+    """
+
+    suffix = ".rec"
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._sources = dict()
+        os.makedirs(directory, exist_ok=True)
+
+    def record(self, net, name, input_shapes, input_data=None, **record_args):
+        """Fetch a recording from the cache, calling `~torchrecorder.record` on a miss.
+
+        Takes the same arguments as `~torchrecorder.record`. If any of
+        ``record_args`` is not a plain value (like an ``opaque`` function or a
+        ``cost_model``), whose `repr` would differ between runs, the cache is
+        bypassed and ``net`` is recorded as usual.
+
+        Returns:
+            a `~torchrecorder.recorder.Recorder`\ ; recordings loaded from the
+            cache are compact, and their ``fn``\ s are all
+            `~torchrecorder.nodes.FnSummary`\ s
+
+        """
+        if not all(_plain(v) for v in record_args.values()):
+            return record(net, name, input_shapes, input_data, **record_args)
+        key = self.key(net, name, input_shapes, input_data, **record_args)
+        rec = self.get(key)
+        if rec is None:
+            rec = record(net, name, input_shapes, input_data, **record_args)
+            self.put(key, rec)
+        return rec
+
+    def key(self, net, name, input_shapes, input_data=None, **record_args):
+        """Hash everything that determines the recording of ``net``.
+
+        The hash covers the qualified name, class, class source,
+        ``extra_repr`` and training mode of each submodule, the shapes and
+        dtypes of the parameters and buffers, the shapes and dtypes of the
+        inputs, and the remaining arguments to `~torchrecorder.record`.
+
+        Returns:
+            a hexadecimal `str`
+        """
+        h = hashlib.sha256()
+
+        def update(*args):
+            h.update(repr(args).encode("utf-8"))
+
+        update(FORMAT_VERSION, name, sorted(record_args.items()))
+        for qualname, m in net.named_modules():
+            cls = type(m)
+            update(qualname, cls.__module__, cls.__qualname__, self._source(cls))
+            update(m.extra_repr(), m.training)
+        for n, p in net.named_parameters():
+            update(n, tuple(p.shape), str(p.dtype), p.requires_grad)
+        for n, b in net.named_buffers():
+            update(n, tuple(b.shape), str(b.dtype))
+
+        if input_data is not None:
+            data = input_data if isinstance(input_data, tuple) else (input_data,)
+            update([(tuple(d.shape), str(d.dtype)) for d in data])
+        else:
+            update(input_shapes, str(get_default_dtype()))
+        return h.hexdigest()
+
+    def get(self, key):
+        """Load the recording cached under ``key``, or return `None`.
+
+        A recording that `~torchrecorder.serialize.load_binary` rejects, like
+        one truncated by a crash or failing its checksum, is deleted and counts
+        as a miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                rec = load_binary(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        os.utime(path)
+        return rec
+
+    def put(self, key, rec):
+        """Save ``rec`` under ``key``, and evict old recordings if necessary."""
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                dump_binary(rec, f)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        """Delete the least recently used recordings until the cache fits in
+        `.max_bytes`. The recording under ``keep`` is never deleted.
+        """
+        entries = []
+        for fname in os.listdir(self.directory):
+            if fname.endswith(self.suffix):
+                stat = os.stat(os.path.join(self.directory, fname))
+                entries.append((stat.st_mtime, stat.st_size, fname))
+        total = sum(size for _, size, _ in entries)
+        for _, size, fname in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if keep is not None and fname == keep + self.suffix:
+                continue
+            try:
+                os.remove(os.path.join(self.directory, fname))
+            except OSError:
+                continue
+            total -= size
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def _source(self, cls):
+        """Hash of the source code of ``cls``, empty if it is unavailable."""
+        if cls not in self._sources:
+            try:
+                src = inspect.getsource(cls)
+            except (OSError, TypeError):
+                src = ""
+            self._sources[cls] = hashlib.sha256(src.encode("utf-8")).hexdigest()
+        return self._sources[cls]
+
+
+def _plain(value):
+    """Whether ``value`` has the same `repr` in every run, for `RecordingCache.key`."""
+    if isinstance(value, (list, tuple)):
+        return all(_plain(v) for v in value)
+    return value is None or isinstance(value, (bool, int, float, str))
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+    torchrecorder.cost
+    ~~~~~~~~~~~~~
+
+    Estimate the arithmetic cost of recorded operations
+
+    :copyright: (c) 2020 by Gautham Venkatasubramanian.
+    :license: see LICENSE for more details.
+"""
+from .nodes import OpNode
+from .stats import rollup
+
+
+def _prod(xs):
+    total = 1
+    for x in xs:
+        total *= x
+    return total
+
+
+def _saved_shape(gf, name):
+    """Shape of the tensor saved as ``name`` by ``gf``, or `None`."""
+    for attr in ("_saved_{}_sym_sizes", "_saved_{}_sizes"):
+        shape = getattr(gf, attr.format(name), None)
+        if shape is not None:
+            return tuple(shape)
+    tensor = getattr(gf, "_saved_" + name, None)
+    return None if tensor is None else tuple(tensor.shape)
+
+
+def _out_shape(gf):
+    """Shape of the first output of the forward op of ``gf``, or `None`."""
+    try:
+        return tuple(gf._input_metadata[0].shape)
+    except (AttributeError, IndexError):
+        result = getattr(gf, "_saved_result", None)
+        return None if result is None else tuple(result.shape)
+
+
+def addmm_cost(gf):
+    """``mat1 @ mat2`` plus a bias."""
+    m, k = _saved_shape(gf, "mat1")
+    n = _saved_shape(gf, "mat2")[-1]
+    macs = m * k * n
+    return 2 * macs + m * n, macs
+
+
+def matmul_cost(gf):
+    """``mm`` and ``bmm``: one MAC per output element per reduced element."""
+    out = _out_shape(gf)
+    self_shape = _saved_shape(gf, "self")
+    mat2_shape = _saved_shape(gf, "mat2")
+    if out is None or (self_shape is None and mat2_shape is None):
+        return None
+    k = self_shape[-1] if self_shape is not None else mat2_shape[-2]
+    macs = _prod(out) * k
+    return 2 * macs, macs
+
+
+def conv_cost(gf):
+    """Convolutions, including transposed and grouped ones."""
+    weight = _saved_shape(gf, "weight")
+    if weight is None:
+        return None
+    kernel = _prod(weight[2:])
+    if gf._saved_transposed:
+        inp = _saved_shape(gf, "input")
+        if inp is None:
+            return None
+        macs = _prod(inp) * weight[1] * kernel
+    else:
+        out = _out_shape(gf)
+        if out is None:
+            return None
+        macs = _prod(out) * weight[1] * kernel
+    flops = 2 * macs
+    if getattr(gf, "_saved_bias_sym_sizes_opt", None) is not None:
+        out = _out_shape(gf)
+        flops += 0 if out is None else _prod(out)
+    return flops, macs
+
+
+def attention_cost(gf):
+    """``scaled_dot_product_attention``: the two batched products."""
+    q = _saved_shape(gf, "query")
+    k = _saved_shape(gf, "key")
+    v = _saved_shape(gf, "value")
+    if q is None or k is None or v is None:
+        return None
+    batch = _prod(q[:-2])
+    macs = batch * q[-2] * k[-2] * (q[-1] + v[-1])
+    return 2 * macs + 3 * batch * q[-2] * k[-2], macs
+
+
+def pool_cost(gf):
+    """Windowed pooling: one FLOP per element of each window."""
+    out = _out_shape(gf)
+    kernel = getattr(gf, "_saved_kernel_size", None)
+    if out is None or kernel is None:
+        return None
+    return _prod(out) * _prod(kernel), 0
+
+
+def reduce_cost(gf):
+    """Reductions over the input."""
+    shape = _saved_shape(gf, "self")
+    if shape is None:
+        return None
+    return _prod(shape), 0
+
+
+def elementwise_cost(per_element):
+    """Cost of an op taking ``per_element`` FLOPs for each output element."""
+
+    def cost(gf):
+        out = _out_shape(gf)
+        if out is None:
+            return None
+        return per_element * _prod(out), 0
+
+    cost.__doc__ = "{} FLOP(s) per output element.".format(per_element)
+    return cost
+
+
+def default_rules():
+    """The rules used by a `CostModel` unless told otherwise.
+
+    Returns:
+        a `dict` mapping ``grad_fn`` class names, without the trailing version
+        number, to rules
+    """
+    rules = dict(
+        AddmmBackward=addmm_cost,
+        MmBackward=matmul_cost,
+        BmmBackward=matmul_cost,
+        ConvolutionBackward=conv_cost,
+        CudnnConvolutionBackward=conv_cost,
+        MkldnnConvolutionBackward=conv_cost,
+        ScaledDotProductFlashAttentionBackward=attention_cost,
+        ScaledDotProductFlashAttentionForCpuBackward=attention_cost,
+        ScaledDotProductEfficientAttentionBackward=attention_cost,
+        ScaledDotProductCudnnAttentionBackward=attention_cost,
+        MaxPool2DWithIndicesBackward=pool_cost,
+        MaxPool3DWithIndicesBackward=pool_cost,
+        AvgPool2DBackward=pool_cost,
+        AvgPool3DBackward=pool_cost,
+        SumBackward=reduce_cost,
+        MeanBackward=reduce_cost,
+        AdaptiveAvgPool2DBackward=reduce_cost,
+        AdaptiveAvgPool3DBackward=reduce_cost,
+    )
+    for name in ["Add", "Sub", "Mul", "Div", "Neg", "Relu", "Threshold", "Hardtanh"]:
+        rules[name + "Backward"] = elementwise_cost(1)
+    for name in ["Sigmoid", "Tanh", "Exp", "Log", "Sqrt", "Rsqrt", "Pow", "Silu"]:
+        rules[name + "Backward"] = elementwise_cost(4)
+    for name in ["Gelu", "Softmax", "LogSoftmax"]:
+        rules[name + "Backward"] = elementwise_cost(5)
+    for name in ["NativeBatchNorm", "CudnnBatchNorm", "NativeLayerNorm"]:
+        rules[name + "Backward"] = elementwise_cost(5)
+    return rules
+
+
+class CostModel(object):
+    """Estimate the FLOPs and MACs of recorded operations.
+
+    Each rule takes a ``grad_fn`` and returns a ``(flops, macs)`` `tuple`, or
+    `None` if the cost cannot be estimated. Rules read the shapes of the
+    tensors that the ``grad_fn`` saved for the backward pass, and the shapes of
+    the outputs of the forward op, so they also work on ``meta`` recordings.
+    Operations without a rule, like views, are assumed to be free.
+
+    The estimates are rough: elementwise ops are charged a fixed number of
+    FLOPs per output element, and a multiply-add counts as two FLOPs.
+
+    Attributes:
+        rules (dict):   maps ``grad_fn`` class names, without the trailing
+                        version number, to rules (see `default_rules`)
+    """
+
+    def __init__(self, rules=None):
+        self.rules = default_rules()
+        if rules is not None:
+            self.rules.update(rules)
+
+    def register(self, typename, rule):
+        """Use ``rule`` for ``grad_fn``\ s of class ``typename``, like ``"AddmmBackward"``."""
+        self.rules[typename.rstrip("0123456789")] = rule
+
+    def __call__(self, gf):
+        """Estimate the cost of ``gf``.
+
+        Returns:
+            a ``(flops, macs)`` `tuple`, or `None`
+        """
+        rule = self.rules.get(type(gf).__name__.rstrip("0123456789"))
+        if rule is None:
+            return None
+        return rule(gf)
+
+    def annotate(self, rec):
+        """Store the estimated costs in the ``stats`` of the nodes of ``rec``.
+
+        Every `~torchrecorder.nodes.OpNode` with a known cost gets ``"flops"``
+        and ``"macs"``; these are then summed up the hierarchy of
+        `~torchrecorder.nodes.LayerNode`\ s into ``"flops_total"`` and
+        ``"macs_total"`` (see `~torchrecorder.stats.rollup`). Must be called
+        before `~torchrecorder.recorder.Recorder.compact`\ .
+
+        Args:
+            rec (`~torchrecorder.recorder.Recorder`):
+
+        Returns:
+            `None`
+
+        """
+        seen = set()
+        for node in rec.nodes.values():
+            if not isinstance(node, OpNode) or node in seen:
+                continue
+            seen.add(node)
+            cost = self(node.fn)
+            if cost is not None:
+                node.stats["flops"], node.stats["macs"] = cost
+        rollup(rec, "flops")
+        rollup(rec, "macs")
+
+    def __repr__(self):
+        return "CostModel({})".format(", ".join(sorted(self.rules)))
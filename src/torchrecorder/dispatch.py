@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+    torchrecorder.dispatch
+    ~~~~~~~~~~~~~~~~~
+
+    Record the graph of a network from the ops it dispatches
+
+    :copyright: (c) 2020 by Gautham Venkatasubramanian.
+    :license: see LICENSE for more details.
+"""
+from torch import Tensor, inference_mode, randn
+from torch.nn.modules.module import (
+    register_module_forward_pre_hook,
+    register_module_forward_hook,
+)
+from torch.utils._python_dispatch import TorchDispatchMode
+from torch.utils._pytree import tree_flatten
+from torch.utils.weak import WeakIdKeyDictionary
+from .helpers import meta_call
+from .nodes import TensorNode, ParamNode, OpNode, LayerNode, FnSummary
+from .recorder import Recorder
+
+
+def capture(net, name, input_shapes, input_data=None, meta=False):
+    """Record the graph of a `torch.nn.Module` from the ATen ops it runs.
+
+    ``net`` is run once under `torch.inference_mode`, with a
+    `~torch.utils._python_dispatch.TorchDispatchMode` logging every ATen op
+    along with the tensors it reads and writes. Since autograd is not
+    involved, the inputs need not require gradients, and the ops that
+    autograd does not see (integer ops, code under `torch.no_grad`) are
+    recorded too.
+
+    The result has the same structure as a recording made with hooks:
+
+    * every submodule gets a `~torchrecorder.nodes.LayerNode`\ , and each op
+      is placed in the `~torchrecorder.nodes.LayerNode` of the innermost
+      module running when it was dispatched;
+    * each op gets a `~torchrecorder.nodes.OpNode` named after its overload
+      packet (like ``addmm`` or ``relu_``), connected to the ops or tensors
+      that produced its inputs;
+    * parameters get a `~torchrecorder.nodes.ParamNode` when an op first
+      reads them, and values passed into or out of a module get a
+      `~torchrecorder.nodes.TensorNode`\ .
+
+    The ``fn`` of the nodes other than `~torchrecorder.nodes.LayerNode`\ s and
+    `~torchrecorder.nodes.ParamNode`\ s are `~torchrecorder.nodes.FnSummary`\ s,
+    and tensors are tracked with weak references, so no activation is kept
+    alive. Buffers and constants are not recorded. Every op and every module
+    call is added to `~torchrecorder.recorder.Recorder.events` with the time it
+    took.
+
+    Args:
+        net (`torch.nn.Module`):
+        name (str): name of the network
+        input_shapes (None, tuple or list(tuple)):
+                    `tuple` if ``net`` has a single input,
+                    `list` ( `tuple` ), `None`
+                    if ``input_data`` is provided
+        input_data (`torch.Tensor` or `tuple` (`torch.Tensor` ), optional):
+                    if ``net`` requires normalized inputs,
+                    provide them here instead of setting ``input_shapes``.
+        meta (bool, optional): run on the ``meta`` device (see
+                    `~torchrecorder.record`). Default `False`.
+
+    Returns:
+        a `~torchrecorder.recorder.Recorder` object containing the graph
+
+    """
+    device = "meta" if meta else None
+    if input_data is not None:
+        data = input_data if isinstance(input_data, tuple) else (input_data,)
+        args = tuple(d.to(device) if meta else d for d in data)
+    elif isinstance(input_shapes, list):
+        args = tuple(randn(shape, device=device) for shape in input_shapes)
+    else:
+        args = (randn(input_shapes, device=device),)
+
+    rec = Recorder()
+    rec.insert_layers(net, name=name)
+    mode = _Capture(rec)
+    for i, x in enumerate(args):
+        label = "Input" if len(args) == 1 else "Input-" + str(i + 1)
+        mode.producers[x] = rec.insert(FnSummary.of(x), TensorNode, 0, None, label).fn
+
+    handles = [
+        register_module_forward_pre_hook(mode.prehook),
+        register_module_forward_hook(mode.posthook),
+    ]
+    try:
+        with inference_mode(), mode:
+            pred = meta_call(net, args) if meta else net(*args)
+    finally:
+        for h in handles:
+            h.remove()
+
+    outputs = [y for y in tree_flatten(pred)[0] if isinstance(y, Tensor)]
+    for i, y in enumerate(outputs):
+        label = "Output" if len(outputs) == 1 else "Output-" + str(i + 1)
+        rec.nodes[mode.producers[y]].name = label
+    return rec
+
+
+class _Capture(TorchDispatchMode):
+    """Record the ops dispatched between the module hooks of `capture`.
+
+    ``producers`` maps each live tensor to the ``fn`` of the node that last
+    wrote it, ``params`` maps the `id` of each parameter seen by the hooks to
+    the parameter and its owner, and ``stack`` holds the
+    `~torchrecorder.nodes.LayerNode`\ s of the modules currently running,
+    which started at the `~torchrecorder.recorder.Recorder.clock` times in
+    ``begins``\ .
+    """
+
+    def __init__(self, rec):
+        TorchDispatchMode.__init__(self)
+        self.rec = rec
+        self.layers = dict(
+            (id(x.fn), x) for x in rec.nodes.values() if isinstance(x, LayerNode)
+        )
+        self.producers = WeakIdKeyDictionary()
+        self.params = dict()
+        self.stack = []
+        self.begins = []
+
+    def __torch_dispatch__(self, func, types, args=(), kwargs=None):
+        kwargs = {} if kwargs is None else kwargs
+        begin = self.rec.clock()
+        out = func(*args, **kwargs)
+        end = self.rec.clock()
+        if len(self.stack) == 0:
+            return out
+        rec = self.rec
+        scope = self.stack[-1]
+        outputs = [y for y in tree_flatten(out)[0] if isinstance(y, Tensor)]
+        if len(outputs) != 0:
+            summary = FnSummary.of(outputs[0])
+            summary.typename = func.overloadpacket.__name__
+        else:
+            summary = FnSummary(func.overloadpacket.__name__)
+        op = rec.insert(summary, OpNode, scope.depth + 1, scope.fn).fn
+        rec.add_event(op, begin, end)
+        for x in tree_flatten((args, kwargs))[0]:
+            src = self.source(x) if isinstance(x, Tensor) else None
+            if src is not None:
+                rec.add_edge(_from=src, _to=op)
+        for y in outputs:
+            self.producers[y] = op
+        return out
+
+    def source(self, x):
+        """The ``fn`` of the node that produced the tensor ``x``\ , if any.
+
+        A parameter gets a `~torchrecorder.nodes.ParamNode` the first time
+        it is read.
+        """
+        entry = self.params.get(id(x))
+        if entry is None or entry[0] is not x:
+            return self.producers.get(x)
+        param, owner, attr = entry
+        if param not in self.rec.fn_set:
+            depth = self.rec.nodes[owner].depth + 1
+            self.rec.insert(param, ParamNode, depth, owner, attr)
+        return param
+
+    def prehook(self, module, inputs):
+        """Enter ``module``\ , marking its tensor ``inputs`` at its boundary."""
+        node = self.layers.get(id(module))
+        if node is None:
+            return
+        for attr, param in module._parameters.items():
+            if param is not None:
+                self.params[id(param)] = (param, module, attr)
+        for x in tree_flatten(inputs)[0]:
+            if isinstance(x, Tensor):
+                src = self.source(x)
+                if src is None or isinstance(self.rec.nodes[src], OpNode):
+                    self.boundary(x, src, node)
+        self.stack.append(node)
+        self.begins.append(self.rec.clock())
+
+    def posthook(self, module, inputs, outputs):
+        """Leave ``module``\ , marking its tensor ``outputs`` at its boundary.
+
+        As in `~torchrecorder.recorder.posthook`, an output already marked at
+        the boundary of a submodule is moved out of ``module``\ .
+        """
+        node = self.layers.get(id(module))
+        if node is None:
+            return
+        self.stack.pop()
+        begin = self.begins.pop()
+        rec = self.rec
+        for y in tree_flatten(outputs)[0]:
+            if not isinstance(y, Tensor):
+                continue
+            src = self.source(y)
+            x = None if src is None else rec.nodes[src]
+            if not isinstance(x, TensorNode):
+                self.boundary(y, src, node)
+            elif x.parent is module:
+                x.parent = node.parent
+                x.depth = node.depth
+                node.subnets.discard(src)
+                if node.parent is not None:
+                    rec.nodes[node.parent].subnets.add(src)
+        rec.add_event(module, begin, rec.clock())
+
+    def boundary(self, x, src, node):
+        """Add a `~torchrecorder.nodes.TensorNode` for ``x`` next to ``node``\ ."""
+        rec = self.rec
+        tensor = rec.insert(FnSummary.of(x), TensorNode, node.depth, node.parent).fn
+        if src is not None:
+            rec.add_edge(_from=src, _to=tensor)
+        self.producers[x] = tensor
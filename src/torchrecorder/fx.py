@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+    torchrecorder.fx
+    ~~~~~~~~~~~
+
+    Record the graph of a network by symbolic tracing with `torch.fx`
+
+    :copyright: (c) 2020 by Gautham Venkatasubramanian.
+    :license: see LICENSE for more details.
+"""
+from torch import empty
+from torch.nn import Module, Parameter
+from torch.fx import symbolic_trace
+from torch.fx.node import map_arg
+from torch.fx.passes.shape_prop import ShapeProp
+from .helpers import meta_call
+from .nodes import TensorNode, ParamNode, OpNode, FnSummary
+from .recorder import Recorder
+
+
+def trace(net, name, input_shapes, input_data=None):
+    """Record the graph of a `torch.nn.Module` without running it.
+
+    ``net`` is traced with `torch.fx.symbolic_trace`, and the shapes are
+    propagated on the ``meta`` device, so no tensor computation is performed.
+    Unlike `~torchrecorder.record`, the inputs need not require gradients and
+    ``net`` is traced in its current mode, so operations that autograd does
+    not see (code under `torch.no_grad`, integer ops, ``size`` calls) are
+    recorded as well. ``net`` must be traceable by `torch.fx`\ .
+
+    The result has the same structure as a recording made with hooks:
+
+    * every submodule gets a `~torchrecorder.nodes.LayerNode`\ , and each
+      operation is placed in the `~torchrecorder.nodes.LayerNode` of the module
+      that `torch.fx` attributes it to;
+    * `torch.nn` modules are not traced through, and appear as a single
+      `~torchrecorder.nodes.OpNode` named after their class, connected to
+      their parameters;
+    * values passed between modules get a `~torchrecorder.nodes.TensorNode`\ .
+
+    The ``fn`` of the nodes other than `~torchrecorder.nodes.LayerNode`\ s and
+    `~torchrecorder.nodes.ParamNode`\ s are `~torchrecorder.nodes.FnSummary`\ s.
+    Buffers are not recorded.
+
+    Args:
+        net (`torch.nn.Module`):
+        name (str): name of the network
+        input_shapes (None, tuple or list(tuple)):
+                    `tuple` if ``net`` has a single input,
+                    `list` ( `tuple` ), `None`
+                    if ``input_data`` is provided
+        input_data (`torch.Tensor` or `tuple` (`torch.Tensor` ), optional):
+                    only the shapes and dtypes are used
+
+    Returns:
+        a `~torchrecorder.recorder.Recorder` object containing the graph
+
+    """
+    if input_data is not None:
+        data = input_data if isinstance(input_data, tuple) else (input_data,)
+        args = tuple(d.to("meta") for d in data)
+    elif isinstance(input_shapes, list):
+        args = tuple(empty(shape, device="meta") for shape in input_shapes)
+    else:
+        args = (empty(input_shapes, device="meta"),)
+
+    gm = symbolic_trace(net)
+    meta_call(_ShapeProp(gm), args)
+
+    rec = Recorder()
+    rec.insert_layers(net, name=name)
+    modules = dict(net.named_modules())
+    env = dict()
+    scopes = dict()
+    placeholders = [n for n in gm.graph.nodes if n.op == "placeholder"]
+    for n in gm.graph.nodes:
+        if n.op == "placeholder":
+            i = placeholders.index(n)
+            label = "Input" if len(placeholders) == 1 else "Input-" + str(i + 1)
+            env[n] = rec.insert(_summary(n), TensorNode, 0, None, label).fn
+            scopes[n] = None
+        elif n.op == "get_attr":
+            obj = _fetch(net, n.target)
+            if isinstance(obj, Parameter):
+                env[n] = _add_param(rec, net, n.target)
+                scopes[n] = None
+        elif n.op in ("call_function", "call_method", "call_module"):
+            stack = n.meta.get("nn_module_stack")
+            scope = modules[next(reversed(stack))] if stack else net
+            if n.op == "call_module":
+                typename = type(modules[n.target]).__name__
+            elif n.op == "call_method":
+                typename = n.target
+            else:
+                typename = getattr(n.target, "__name__", str(n.target))
+            depth = rec.nodes[scope].depth + 1
+            op = rec.insert(_summary(n, typename), OpNode, depth, scope).fn
+            env[n] = op
+            scopes[n] = scope
+            if n.op == "call_module":
+                for pname, _ in modules[n.target].named_parameters():
+                    param = _add_param(rec, net, n.target + "." + pname)
+                    rec.add_edge(_from=param, _to=op)
+
+    outputs = []
+    for n in gm.graph.nodes:
+        if n.op == "output":
+            map_arg(n.args[0], outputs.append)
+    tensors = dict()
+    for n in gm.graph.nodes:
+        if n in env:
+            consumers = [u for u in n.users if u in env]
+            tensors[n] = _connect(rec, n, consumers, n in outputs, env, scopes)
+
+    for i, n in enumerate(outputs):
+        if tensors.get(n) is not None:
+            label = "Output" if len(outputs) == 1 else "Output-" + str(i + 1)
+            rec.nodes[tensors[n]].name = label
+    return rec
+
+
+class _ShapeProp(Module):
+    """Run `torch.fx.passes.shape_prop.ShapeProp` under `meta_call`."""
+
+    def __init__(self, gm):
+        Module.__init__(self)
+        self.gm = gm
+
+    def forward(self, *args):
+        return ShapeProp(self.gm).propagate(*args)
+
+
+def _add_param(rec, net, target):
+    """Add a `~torchrecorder.nodes.ParamNode` for the parameter ``target``, as `param_acc` does."""
+    path, _, attr = target.rpartition(".")
+    owner = net.get_submodule(path) if path else net
+    param = getattr(owner, attr)
+    if param not in rec.fn_set:
+        depth = rec.nodes[owner].depth + 1
+        rec.insert(param, ParamNode, depth, owner, attr)
+    return param
+
+
+def _fetch(net, target):
+    obj = net
+    for attr in target.split("."):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def _summary(n, typename="Tensor"):
+    """`~torchrecorder.nodes.FnSummary` of the value computed by the `torch.fx` node ``n``."""
+    meta = n.meta.get("tensor_meta")
+    if not hasattr(meta, "shape"):
+        return FnSummary(typename)
+    return FnSummary(typename, tuple(meta.shape), str(meta.dtype), "meta")
+
+
+def _connect(rec, n, consumers, is_output, env, scopes):
+    """Add the edges from the `torch.fx` node ``n`` to its ``consumers``.
+
+    If ``n`` is an operation whose value is used outside its module, or is an
+    output of the network, a `~torchrecorder.nodes.TensorNode` for the value is
+    placed in the innermost module containing ``n`` and all those consumers.
+
+    Returns:
+        the ``fn`` of the new `~torchrecorder.nodes.TensorNode`, or `None`
+    """
+    src = env[n]
+    crossing = [u for u in consumers if scopes[u] is not scopes[n]]
+    is_op = isinstance(rec.nodes[src], OpNode)
+    needed = is_output or (is_op and len(crossing) != 0)
+    tensor = None
+    if needed and getattr(src, "shape", None) is not None:
+        scope = None
+        if not is_output:
+            scope = scopes[n]
+            for u in crossing:
+                scope = _common_scope(rec, scope, scopes[u])
+        depth = rec.nodes[scope].depth + 1
+        tensor = rec.insert(_summary(n), TensorNode, depth, scope).fn
+        rec.add_edge(_from=src, _to=tensor)
+    for u in consumers:
+        if tensor is not None and u in crossing:
+            rec.add_edge(_from=tensor, _to=env[u])
+        else:
+            rec.add_edge(_from=src, _to=env[u])
+    return tensor
+
+
+def _common_scope(rec, a, b):
+    """Innermost `torch.nn.Module` containing the recorded modules ``a`` and ``b``."""
+    while a is not b:
+        if rec.nodes[a].depth >= rec.nodes[b].depth:
+            a = rec.nodes[a].parent
+        else:
+            b = rec.nodes[b].parent
+    return a
@@ -8,9 +8,14 @@
     :copyright: (c) 2020 by Gautham Venkatasubramanian.
     :license: see LICENSE for more details.
 """
-from torch import randn
+from collections import OrderedDict
+from functools import partial
+from torch import randn, empty_like
+from torch.nn import Parameter
 from .recorder import Recorder
 from .renderer.gv import GraphvizRenderer
+from .renderer.dot import DotRenderer
+from .stats import rollup
 from graphviz import Digraph
 
 
@@ -23,6 +28,11 @@ def render_network(
     fmt="svg",
     input_data=None,
     render_depth=1,
+    meta=False,
+    cache=None,
+    backend="hooks",
+    expand=None,
+    edge_counts=False,
     **styler_args
 ):
     """Render the structure of a `torch.nn.Module` to an image via `graphviz`.
@@ -39,21 +49,68 @@ def render_network(
         input_data (`torch.Tensor` or `tuple` (`torch.Tensor` ), optional):
                     if ``net`` requires normalized inputs,
                     provide them here instead of setting ``input_shapes``.
-        render_depth (int, optional): Default ``1``.
+        render_depth (int or list(int), optional): Default ``1``. If a `list`,
+                    one image is rendered per depth from a single recording.
+        meta (bool, optional): if `True`, record on the ``meta`` device
+                    (see `record`). Default `False`.
+        cache (`~torchrecorder.cache.RecordingCache`\ , optional): if given,
+                    the recording is fetched from ``cache`` when possible,
+                    instead of running ``net``.
+        backend (str, optional): ``"hooks"``\ , ``"fx"`` or ``"dispatch"``
+                    (see `record`). With ``"fx"`` or ``"dispatch"``\ , ``net``
+                    is recorded in its current mode.
+                    Default ``"hooks"``.
+        expand (list(str), optional): qualified names of modules to be
+                    rendered in full (see `make_dot`).
+        edge_counts (bool, optional): draw edges by the number of recorded
+                    edges they stand for (see `make_dot`). Default `False`.
         **styler_args : node attributes to pass to `graphviz`
 
     """
-    net = net.cpu().train()
-    rec = record(net, name, input_shapes, input_data)
-    g = make_dot(rec, render_depth, styler_cls=None, **styler_args)
-    g.format = fmt
-    g.attr(label="{} at depth = {}".format(name, render_depth))
-    g.render("{}-{}".format(name, render_depth), directory=directory, cleanup=True)
+    if backend == "hooks":
+        if not meta:
+            net = net.cpu()
+        net = net.train()
+    args = dict(meta=meta, backend=backend)
+    if cache is not None:
+        rec = cache.record(net, name, input_shapes, input_data, **args)
+    else:
+        rec = record(net, name, input_shapes, input_data, **args)
+    if isinstance(render_depth, (list, tuple)):
+        render_depths = render_depth
+    else:
+        render_depths = [render_depth]
+    graphs = make_dots(rec, render_depths, None, expand, edge_counts, **styler_args)
+    for depth, g in graphs.items():
+        g.format = fmt
+        g.attr(label="{} at depth = {}".format(name, depth))
+        g.render("{}-{}".format(name, depth), directory=directory, cleanup=True)
 
 
-def record(net, name, input_shapes, input_data=None):
+def record(
+    net,
+    name,
+    input_shapes,
+    input_data=None,
+    meta=False,
+    compact=False,
+    profile=0,
+    memory=False,
+    cost_model=None,
+    zero_copy=False,
+    backend="hooks",
+    previous=None,
+    max_record_depth=None,
+    opaque=None,
+    global_hooks=False,
+    backward=False,
+):
     """Record the graph by running a single pass of a `torch.nn.Module`.
 
+    If ``meta`` is `True`, the inputs, parameters and buffers are replaced by
+    tensors on the ``meta`` device for the duration of the pass, so only shapes
+    and the autograd structure are computed. ``net`` itself is not modified.
+
     Args:
         net (`torch.nn.Module`):
         name (str): name of the network
@@ -64,53 +121,215 @@ def record(net, name, input_shapes, input_data=None):
         input_data (`torch.Tensor` or `tuple` (`torch.Tensor` ), optional):
                     if ``net`` requires normalized inputs,
                     provide them here instead of setting ``input_shapes``.
+        meta (bool, optional): record a shape-only pass. Default `False`.
+        compact (bool or str, optional): call `~.Recorder.compact` after the
+                    pass, so that no tensors are held by the `~.Recorder`\ .
+                    ``"columnar"`` also stores the nodes and edges in columns
+                    (see `~torchrecorder.store.NodeStore`). Default `False`.
+        profile (int, optional): number of additional passes over which each
+                    `~torchrecorder.nodes.LayerNode` is timed
+                    (see `~.Recorder.profile_passes`). Default ``0``.
+        memory (bool, optional): measure the memory used by each
+                    `~torchrecorder.nodes.LayerNode` (see `~.Recorder.memory`),
+                    and sum ``"param_bytes"`` and ``"act_bytes"`` into
+                    ``"param_bytes_total"`` and ``"act_bytes_total"``
+                    (see `~torchrecorder.stats.rollup`). Default `False`.
+        cost_model (`~torchrecorder.cost.CostModel`, optional): estimate the
+                    FLOPs and MACs of each `~torchrecorder.nodes.OpNode` and sum
+                    them up the hierarchy of `~torchrecorder.nodes.LayerNode`\ s
+                    (see `~torchrecorder.cost.CostModel.annotate`).
+        zero_copy (bool, optional): mark module boundaries with views instead
+                    of copies of the activations (see `~.Recorder.zero_copy`).
+                    Default `False`.
+        backend (str, optional): ``"hooks"`` to record a pass as described
+                    above, ``"fx"`` to trace ``net`` symbolically instead
+                    (see `torchrecorder.fx.trace`), or ``"dispatch"`` to
+                    record the ATen ops of a pass under `torch.inference_mode`
+                    (see `torchrecorder.dispatch.capture`). The ``"fx"``
+                    backend always works on the ``meta`` device. Neither
+                    supports ``profile``, ``memory``, ``cost_model``,
+                    ``zero_copy``, ``max_record_depth``, ``opaque``\ ,
+                    ``global_hooks`` or ``backward``. Default ``"hooks"``.
+        previous (`~.Recorder`, optional): a recording of an earlier version
+                    of ``net``\ , made with the same arguments. Only the
+                    submodules that have changed since are run, and spliced
+                    into ``previous`` (see `torchrecorder.incremental.update`).
+                    The result is always compacted.
+        max_record_depth (int, optional): depth of the submodules to be
+                    recorded as opaque leaves: they are not hooked into, and
+                    only the ops returning their outputs are recorded,
+                    connected to their inputs and parameters. Recording then
+                    costs about as much as the depth rendered, if that is at
+                    most ``max_record_depth``\ . Default `None`, to record
+                    every submodule in full.
+        opaque (callable, optional): called as ``opaque(qualname, module)``
+                    for each submodule, to record more submodules as opaque
+                    leaves. Default `None`.
+        global_hooks (bool, optional): register one global pair of hooks for
+                    all modules, instead of a pair per submodule, so adding
+                    and removing the hooks takes constant time
+                    (see `~.Recorder.global_hooks`). Default `False`.
+        backward (bool, optional): run backward from the outputs once
+                    recorded, storing the time spent on the gradients of each
+                    op and the order in which they ran (see
+                    `~.Recorder.time_backward`). The per-op times are summed
+                    up to each `~torchrecorder.nodes.LayerNode` as
+                    ``"grad_time_total"``\ . Implies ``zero_copy``\ .
+                    Default `False`.
 
     Returns:
         a `~.Recorder` object containing the execution graph
 
     """
+    if previous is not None:
+        from .incremental import update
+
+        args = dict(meta=meta, profile=profile, memory=memory, backend=backend)
+        args.update(cost_model=cost_model, zero_copy=zero_copy)
+        args.update(max_record_depth=max_record_depth, opaque=opaque)
+        args.update(global_hooks=global_hooks, backward=backward)
+        return update(previous, net, name, input_shapes, input_data, **args)[0]
+    if backend in ("fx", "dispatch"):
+        message = "Option not supported by the {} backend".format(backend)
+        if profile > 0 or memory or cost_model is not None or zero_copy:
+            raise ValueError(message)
+        if max_record_depth is not None or opaque is not None or global_hooks:
+            raise ValueError(message)
+        if backward:
+            raise ValueError(message)
+        if backend == "fx":
+            from .fx import trace
+
+            rec = trace(net, name, input_shapes, input_data)
+        else:
+            from .dispatch import capture
+
+            rec = capture(net, name, input_shapes, input_data, meta)
+        if compact:
+            rec.compact(columnar=compact == "columnar")
+        return rec
+    elif backend != "hooks":
+        raise ValueError("Unknown backend " + repr(backend))
+
     rec = Recorder()
+    rec.memory = memory
+    # the hooks must not cut the autograd graph at module boundaries
+    rec.zero_copy = zero_copy or backward
+    rec.max_record_depth = max_record_depth
+    rec.opaque = opaque
+    rec.global_hooks = global_hooks
     rec.register_hooks(net, depth=0, parent=None, name=name)
 
     data = []
     data_given = input_data is not None
     single_input = False
+    device = "meta" if meta else None
     if data_given:
         data = input_data
         single_input = not isinstance(input_data, tuple)
+        if meta and single_input:
+            data = data.to(device)
+        elif meta:
+            data = tuple(d.to(device) for d in data)
     else:
         if isinstance(input_shapes, list):
             single_input = False
             for shape in input_shapes:
-                d = randn(shape)
+                d = randn(shape, device=device)
                 data.append(d)
             data = tuple(data)
         elif isinstance(input_shapes, tuple):
             single_input = True
-            data = randn(input_shapes)
+            data = randn(input_shapes, device=device)
 
     if single_input:
         data.requires_grad = True
         rec.add_node(data, depth=0, parent=None, name="Input")
-        pred = net(data)
+        args = (data,)
     else:
         for i, d in enumerate(data):
             d.requires_grad = True
             rec.add_node(d, depth=0, parent=None, name="Input-{i}".format(i=i + 1))
-        pred = net(*data)
+        args = data
 
-    single_output = not isinstance(pred, tuple)
-    if single_output:
-        rec.nodes[pred].name = "Output"
+    if meta:
+        run = partial(meta_call, net, args)
     else:
-        for i, p in enumerate(pred):
-            rec.nodes[p].name = "Output-{i}".format(i=i + 1)
+        run = partial(net, *args)
+    try:
+        pred = run()
+    except BaseException:
+        # global hooks would otherwise stay on every module in the process
+        rec.remove_hooks()
+        raise
+
+    single_output = not isinstance(pred, tuple)
+    outputs = [pred] if single_output else pred
+    for i, p in enumerate(outputs):
+        p = rec.aliases.get(p.grad_fn, p)
+        rec.nodes[p].name = "Output" if single_output else "Output-{}".format(i + 1)
 
+    if cost_model is not None:
+        cost_model.annotate(rec)
+    if memory:
+        rollup(rec, "param_bytes")
+        rollup(rec, "act_bytes")
+    if backward:
+        rec.time_backward(outputs)
+        rollup(rec, "grad_time")
+    if profile > 0:
+        rec.profile_passes(run, profile)
     rec.remove_hooks()
+    if compact:
+        rec.compact(columnar=compact == "columnar")
     return rec
 
 
-def make_dot(rec, render_depth=256, styler_cls=None, **styler_args):
+def meta_state(net):
+    """Construct ``meta`` device stand-ins for the state of a `torch.nn.Module`.
+
+    Args:
+        net (`torch.nn.Module`):
+
+    Returns:
+        a `dict` mapping the qualified names of the parameters and buffers of
+        ``net`` to tensors of the same shape and dtype on the ``meta`` device
+
+    """
+    state = dict()
+    for n, p in net.named_parameters():
+        state[n] = Parameter(empty_like(p, device="meta"), p.requires_grad)
+    for n, b in net.named_buffers():
+        state[n] = empty_like(b, device="meta")
+    return state
+
+
+def meta_call(net, args):
+    """Run ``net`` on ``args`` with its state replaced by `meta_state`.
+
+    Args:
+        net (`torch.nn.Module`):
+        args (tuple): inputs to ``net``, expected on the ``meta`` device
+
+    Returns:
+        the outputs of ``net``, on the ``meta`` device
+
+    """
+    try:
+        from torch.func import functional_call
+    except ImportError:  # torch < 2.0
+        from torch.nn.utils.stateless import functional_call
+    return functional_call(net, meta_state(net), tuple(args))
+
+
+def make_dot(
+    rec,
+    render_depth=256,
+    styler_cls=None,
+    expand=None,
+    edge_counts=False,
+    **styler_args
+):
     """ Produces Graphviz representation from a `~torchrecorder.recorder.Recorder` object
 
     Args:
@@ -118,6 +337,12 @@ def make_dot(rec, render_depth=256, styler_cls=None, **styler_args):
         render_depth (int):     depth until which nodes should be rendered
         styler_cls:             styler class to instantiate when styling nodes.
                                 If `None`, defaults to `.GraphvizStyler`.
+        expand (list(str), optional): qualified names of modules (or `fnmatch`
+                                patterns) to be rendered in full, regardless
+                                of ``render_depth``
+        edge_counts (bool, optional): style each edge by the number of
+                                recorded edges lifted onto it (see
+                                `~.GraphvizStyler.style_weighted_edge`)
     Kwargs:
         styler_args (optional): styler properties to be set for all nodes
 
@@ -125,13 +350,107 @@ def make_dot(rec, render_depth=256, styler_cls=None, **styler_args):
         a `graphviz.Digraph` with the rendered nodes
 
     """
+    graph_attr, node_attr = _dot_attrs(styler_args)
+    g = Digraph(graph_attr=graph_attr, node_attr=node_attr)
+    renderer = GraphvizRenderer(
+        rec=rec,
+        render_depth=render_depth,
+        styler_cls=styler_cls,
+        expand=expand,
+        edge_counts=edge_counts,
+        **styler_args
+    )
+    return renderer(g)
+
+
+def write_dot(
+    rec,
+    f,
+    render_depth=256,
+    styler_cls=None,
+    label=None,
+    expand=None,
+    edge_counts=False,
+    **styler_args
+):
+    """ Writes the Graphviz representation of a `~torchrecorder.recorder.Recorder`
+    object as DOT text, without building a `graphviz.Digraph`\ .
+
+    The output is the same graph that `make_dot` produces, so it can be
+    written to a file or piped straight into the ``stdin`` of ``dot``.
+
+    Args:
+        rec (`~torchrecorder.recorder.Recorder`\ ):
+        f:                      a text file-like object with a ``write`` method
+        render_depth (int):     depth until which nodes should be rendered
+        styler_cls:             see `make_dot`
+        label (str, optional):  label of the graph
+        expand (list(str), optional): see `make_dot`
+        edge_counts (bool, optional): see `make_dot`
+    Kwargs:
+        styler_args (optional): styler properties to be set for all nodes
+
+    Returns:
+        ``f``
+
+    """
+    graph_attr, node_attr = _dot_attrs(styler_args)
+    if label is not None:
+        graph_attr["label"] = label
+    renderer = DotRenderer(
+        rec=rec,
+        render_depth=render_depth,
+        styler_cls=styler_cls,
+        graph_attr=graph_attr,
+        node_attr=node_attr,
+        expand=expand,
+        edge_counts=edge_counts,
+        **styler_args
+    )
+    return renderer(f)
+
+
+def _dot_attrs(styler_args):
+    """Default graph and node attributes for `make_dot` and `write_dot`."""
     graph_attr = dict(compound="true", ranksep="0.5", fontsize="24")
     node_attr = dict(fontsize="20")
     if styler_args.get("fontname", None) is not None:
         graph_attr["fontname"] = styler_args.get("fontname")
         node_attr["fontname"] = styler_args.get("fontname")
-    g = Digraph(graph_attr=graph_attr, node_attr=node_attr)
-    renderer = GraphvizRenderer(
-        rec=rec, render_depth=render_depth, styler_cls=styler_cls, **styler_args
-    )
-    return renderer(g)
+    return graph_attr, node_attr
+
+
+def make_dots(
+    rec,
+    render_depths,
+    styler_cls=None,
+    expand=None,
+    edge_counts=False,
+    **styler_args
+):
+    """ Produces Graphviz representations of a `~torchrecorder.recorder.Recorder`
+    object at multiple depths.
+
+    The depths are rendered from the deepest to the shallowest, so that the
+    preprocessing for each depth is derived from that of the previous one.
+
+    Args:
+        rec (`~torchrecorder.recorder.Recorder`\ ):
+        render_depths (list(int)):  depths at which the nodes should be rendered
+        styler_cls:             see `make_dot`
+        expand (list(str), optional): see `make_dot`
+        edge_counts (bool, optional): see `make_dot`
+    Kwargs:
+        styler_args (optional): styler properties to be set for all nodes
+
+    Returns:
+        an `~collections.OrderedDict` mapping each of ``render_depths`` to a
+        `graphviz.Digraph`\ , in the given order
+
+    """
+    graphs = dict()
+    for depth in sorted(set(render_depths), reverse=True):
+        graphs[depth] = make_dot(
+            rec, depth, styler_cls, expand, edge_counts, **styler_args
+        )
+    return OrderedDict((depth, graphs[depth]) for depth in render_depths)
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+    torchrecorder.incremental
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Re-record only the submodules of a network that have changed
+
+    :copyright: (c) 2020 by Gautham Venkatasubramanian.
+    :license: see LICENSE for more details.
+"""
+from collections import OrderedDict
+import torch
+from .helpers import record
+from .nodes import LayerNode, ParamNode
+from .recorder import module_signature
+from .store import NodeStore
+from .stats import rollup
+
+
+def changed_modules(rec, net):
+    """Find the submodules of ``net`` that differ from those recorded in ``rec``.
+
+    A submodule has changed if its `~torchrecorder.recorder.module_signature`
+    differs from the ``signature`` of the `~torchrecorder.nodes.LayerNode` with
+    the same ``qualname``\ , or if there is no such node. Only the outermost
+    changed submodules are returned, since a re-recording covers all the
+    submodules within. The submodules within an opaque
+    `~torchrecorder.nodes.LayerNode` are not recorded, so they are checked
+    with the ``signature`` of that node, which covers them all.
+
+    Args:
+        rec (`~torchrecorder.recorder.Recorder`):
+        net (`torch.nn.Module`):
+
+    Returns:
+        a `list` of qualified names, ``""`` being ``net`` itself
+
+    """
+    return _outermost(_changed(rec, net, _signatures(net)))
+
+
+def update(rec, net, name, input_shapes, input_data=None, **record_args):
+    """Update the recording ``rec`` of an earlier version of ``net``.
+
+    Each of the `changed_modules` is recorded on its own, using stand-ins with
+    the shapes of the inputs it received in ``rec``, and the new nodes and
+    edges are spliced into ``rec`` in place of the old ones. If a submodule was
+    called more than once, or now returns outputs of a different shape, its
+    parent is re-recorded instead. When that reaches ``net`` itself, ``net`` is
+    recorded afresh from ``input_shapes`` or ``input_data``\ .
+
+    Only the positional tensor inputs seen by the hooks are replayed, so
+    submodules whose ``forward`` depends on other arguments must not be edited
+    between recordings. The totals from `~torchrecorder.stats.rollup` are
+    recomputed, but the timings from ``profile`` and ``backward`` are only
+    refreshed in the re-recorded submodules, whose ``"grad_order"`` then
+    counts from their own outputs. The `~torchrecorder.recorder.Recorder.events`
+    are dropped if any submodule is re-recorded, since the parts were timed by
+    different passes.
+
+    Args:
+        rec (`~torchrecorder.recorder.Recorder`): a recording made by
+                    `~torchrecorder.record`\ , or loaded with
+                    `~torchrecorder.serialize.load_json` or
+                    `~torchrecorder.serialize.load_binary`\ ; it is
+                    compacted and modified
+        net (`torch.nn.Module`):
+        name (str): name of the network
+        input_shapes (None, tuple or list(tuple)): see `~torchrecorder.record`
+        input_data (`torch.Tensor` or `tuple` (`torch.Tensor` ), optional):
+                    see `~torchrecorder.record`
+    Kwargs:
+        record_args (optional): passed to `~torchrecorder.record`\ , and
+                    expected to match those used for ``rec``
+
+    Returns:
+        a `tuple` of the updated `~torchrecorder.recorder.Recorder`\ , which
+        is compacted (though its keys are no longer in recording order,
+        unless it is columnar), and the `list` of qualified names of the submodules that
+        were re-recorded
+
+    """
+    record_args.pop("compact", None)
+    columnar = isinstance(rec.nodes, NodeStore)
+    if any(k is not None and not isinstance(k, int) for k in rec.nodes):
+        rec.compact()
+    modules = dict(net.named_modules())
+    signatures = _signatures(net)
+    pending = _outermost(_changed(rec, net, signatures))
+    done = []
+    while len(pending) != 0:
+        q = pending.pop(0)
+        if q == "":
+            rec = record(
+                net, name, input_shapes, input_data, compact=True, **record_args
+            )
+            if columnar:
+                rec.compact(columnar=True)
+            return rec, [""]
+        key, layer = _layers(rec, keys=True)[q]
+        part = _rerecord(rec, modules[q], layer, record_args)
+        if part is None:
+            pending = _outermost(pending + [q.rpartition(".")[0]])
+            continue
+        _splice(rec, key, part)
+        done.append(q)
+
+    for k, x in _layers(rec, keys=True).values():
+        x.fn = modules[x.qualname]
+        if x.opaque:
+            x.signature = module_signature(x.fn, recurse=True)
+        else:
+            x.signature = signatures[x.qualname]
+        rec.nodes[k] = x
+    totals = set()
+    for x in rec.nodes.values():
+        totals.update(k[: -len("_total")] for k in x.stats if k.endswith("_total"))
+    for k in sorted(totals):
+        rollup(rec, k)
+    if len(done) != 0:
+        rec.events = []
+        if columnar:
+            rec.compact(columnar=True)
+    return rec, _outermost(done)
+
+
+def _signatures(net):
+    """Map the qualified names of the submodules of ``net`` to their signatures."""
+    return dict((q, module_signature(x)) for q, x in net.named_modules())
+
+
+def _changed(rec, net, signatures):
+    """Qualified names in ``signatures`` that do not match a node of ``rec``\ ."""
+    layers = _layers(rec)
+    opaque = [q for q, x in layers.items() if x.opaque]
+    changed = []
+    for q, signature in signatures.items():
+        if any(p != q and (p == "" or q.startswith(p + ".")) for p in opaque):
+            continue
+        old = layers.get(q)
+        if old is not None and old.opaque:
+            signature = module_signature(net.get_submodule(q), recurse=True)
+        if old is None or old.signature != signature:
+            changed.append(q)
+    return changed
+
+
+def _layers(rec, keys=False):
+    """Map the qualified names in ``rec`` to their `~torchrecorder.nodes.LayerNode`\ s."""
+    layers = dict()
+    for k, x in rec.nodes.items():
+        if isinstance(x, LayerNode) and x.qualname is not None:
+            layers[x.qualname] = (k, x) if keys else x
+    return layers
+
+
+def _outermost(qualnames):
+    """Drop the qualified names that lie within another one in ``qualnames``."""
+    qualnames = sorted(set(qualnames))
+    result = []
+    for q in qualnames:
+        if not any(p == "" or q.startswith(p + ".") for p in result):
+            result.append(q)
+    return result
+
+
+def _stand_in(fn):
+    """A random `torch.Tensor` shaped like the `~torchrecorder.nodes.FnSummary` ``fn``."""
+    dtype = getattr(torch, fn.dtype.split(".")[-1])
+    return torch.randn(fn.shape, dtype=dtype, device=fn.device)
+
+
+def _rerecord(rec, module, layer, record_args):
+    """Record ``module`` on its own, as it was called at ``layer``\ .
+
+    Returns:
+        the compacted `~torchrecorder.recorder.Recorder`\ , or `None` if
+        ``module`` cannot replace ``layer``
+    """
+    if len(layer.boundary) != 1 or layer.boundary[0][1] is None:
+        return None
+    inputs, outputs = layer.boundary[0]
+    summaries = [rec.nodes[x].fn for x in inputs]
+    if len(summaries) == 0 or any(
+        not getattr(torch, s.dtype.split(".")[-1]).is_floating_point
+        for s in summaries
+    ):
+        return None
+    data = tuple(_stand_in(s) for s in summaries)
+    record_args = dict(record_args)
+    if record_args.get("max_record_depth") is not None:
+        record_args["max_record_depth"] -= layer.depth
+    opaque = record_args.get("opaque")
+    if opaque is not None:
+        prefix = layer.qualname
+        record_args["opaque"] = lambda q, m: opaque(_join(prefix, q), m)
+    part = record(
+        module,
+        layer.name.split("\n")[0],
+        None,
+        data[0] if len(data) == 1 else data,
+        compact=True,
+        **record_args
+    )
+    top = part.nodes[0]
+    if len(top.boundary) != 1 or len(top.boundary[0][1]) != len(outputs):
+        return None
+    for x, y in zip(top.boundary[0][1], outputs):
+        a, b = part.nodes[x].fn, rec.nodes[y].fn
+        if a.shape != b.shape or a.dtype != b.dtype:
+            return None
+    return part
+
+
+def _splice(rec, key, part):
+    """Replace the subtree of ``rec`` under ``key`` with the recording ``part``\ ."""
+    old = rec.nodes[key]
+    inside = set([key])
+    items = [(k, x) for k, x in rec.nodes.items() if k is not None]
+    for k, x in sorted(items, key=lambda kx: kx[1].depth):
+        if x.parent in inside:
+            inside.add(k)
+
+    top = part.nodes[0]
+    keys = {None: old.parent, 0: key}
+    keys.update(zip(top.boundary[0][0], old.boundary[0][0]))
+    keys.update(zip(top.boundary[0][1], old.boundary[0][1]))
+    boundary = set(keys) - set([None, 0])
+    fresh = max(k for k in rec.nodes if k is not None) + 1
+    for k in part.nodes:
+        if k not in keys:
+            keys[k] = fresh
+            fresh += 1
+
+    added = OrderedDict()
+    for k, x in part.nodes.items():
+        if k is None or k in boundary:
+            continue
+        x.parent = keys[x.parent]
+        x.depth += old.depth
+        if isinstance(x, LayerNode):
+            x.subnets = set(keys[s] for s in x.subnets)
+            x.boundary = [[[keys[y] for y in ys] for ys in b] for b in x.boundary]
+            x.qualname = _join(old.qualname, x.qualname)
+        elif not isinstance(x, ParamNode):
+            x.name = _rename(rec, x.fn.typename)
+        added[keys[k]] = x
+    top.name = old.name.split("\n")[0] + "\n(" + type(top.fn).__name__ + ")"
+
+    nodes = OrderedDict()
+    for k, x in rec.nodes.items():
+        if k == key:
+            nodes.update(added)
+        elif k not in inside:
+            nodes[k] = x
+    rec.nodes = nodes
+    rec.fn_set = set(nodes)
+    edges = set(e for e in rec.edges if e[0] not in inside and e[1] not in inside)
+    edges.update((keys[x], keys[y], z) for x, y, z in part.edges)
+    rec.edges = edges
+    rec.render_cache.clear()
+
+
+def _join(prefix, qualname):
+    """Qualified name of the submodule ``qualname`` of the submodule ``prefix``\ ."""
+    if prefix and qualname:
+        return prefix + "." + qualname
+    return prefix or qualname
+
+
+def _rename(rec, typename):
+    """Name a spliced node after the nodes of ``rec``\ , as `~.Recorder.insert` does."""
+    count = rec.fn_types.get(typename, 0) + 1
+    rec.fn_types[typename] = count
+    return typename if count == 1 else typename + "-" + str(count)
@@ -10,6 +10,44 @@
 """
 
 
+class FnSummary(object):
+    """Lightweight stand-in for the ``fn`` of a `BaseNode`.
+
+    Holds only the information required for rendering, so that the
+    `torch.Tensor`\ s and ``grad_fn``\ s seen during recording can be released.
+
+    Attributes:
+        typename (str):     class name of the summarized object
+        shape (tuple):      shape of the summarized `torch.Tensor`, `None` otherwise
+        dtype (str):        dtype of the summarized `torch.Tensor`, `None` otherwise
+        device (str):       device of the summarized `torch.Tensor`, `None` otherwise
+    """
+
+    __slots__ = ("typename", "shape", "dtype", "device")
+
+    def __init__(self, typename, shape=None, dtype=None, device=None):
+        self.typename = typename
+        self.shape = shape
+        self.dtype = dtype
+        self.device = device
+
+    @classmethod
+    def of(cls, fn):
+        """Summarize ``fn``, which can be any recorded object."""
+        shape = getattr(fn, "shape", None)
+        dtype = getattr(fn, "dtype", None)
+        device = getattr(fn, "device", None)
+        return cls(
+            typename=type(fn).__name__,
+            shape=None if shape is None else tuple(shape),
+            dtype=None if dtype is None else str(dtype),
+            device=None if device is None else str(device),
+        )
+
+    def __repr__(self):
+        return "FnSummary({})".format(self.typename)
+
+
 class BaseNode(object):
     """Wrapper object to encapsulate recorded information.
 
@@ -18,6 +56,7 @@ class BaseNode(object):
         name (str):         name of the `.fn`
         depth (int):        `int`, scope depth of `.fn`
         parent (object):    a `.fn` in whose scope the current `.fn` exists
+        stats (dict):       measurements of `.fn`, such as profiled timings
     """
 
     def __init__(self, name="", fn=None, depth=-1, parent=None):
@@ -25,6 +64,7 @@ class BaseNode(object):
         self.name = name
         self.depth = depth
         self.parent = parent
+        self.stats = dict()
 
     def __str__(self):
         internals = [
@@ -89,6 +129,16 @@ class LayerNode(BaseNode):
                             `.fn` was called
         subnets (set):      a set `~torch.nn.Module` s or ``grad_fn`` s which are
                             called in `.fn` 's `~torch.nn.Module.forward`
+        qualname (str):     qualified name of `.fn` in the recorded network,
+                            as in `~torch.nn.Module.named_modules`
+        signature (str):    digest of the structure of `.fn` when it was
+                            recorded (see `~torchrecorder.recorder.module_signature`)
+        boundary (list):    ``[inputs, outputs]`` for each call of `.fn`\ , each
+                            a `list` of the ``fn``\ s of the recorded tensors
+                            that were passed to or returned from `.fn`
+        opaque (bool):      if `True`, the submodules and operations of `.fn`
+                            were not recorded (see ``max_record_depth`` in
+                            `~torchrecorder.record`)
         pre :     ``handle`` to the prehook on `.fn`
         post :    ``handle`` to the hook on `.fn`
     """
@@ -99,6 +149,10 @@ class LayerNode(BaseNode):
         self.post = None
         self.back = None
         self.subnets = set()
+        self.qualname = None
+        self.signature = None
+        self.boundary = []
+        self.opaque = False
 
     def __str__(self):
         internals = [
@@ -8,10 +8,13 @@
     :copyright: (c) 2019 by Gautham Venkatasubramanian.
     :license: see LICENSE for more details.
 """
+from torch import Tensor, autograd, cuda, ones_like
 from torch.nn import Module
 from collections import OrderedDict
-from .nodes import BaseNode, TensorNode, ParamNode, OpNode, LayerNode
+from .nodes import BaseNode, TensorNode, ParamNode, OpNode, LayerNode, FnSummary
+from .store import NodeStore, EdgeStore
 from functools import partial
+import hashlib
 import time
 
 
@@ -22,9 +25,49 @@ class Recorder(object):
     Attributes:
         fn_set (set):         a set of objects ( `~torchrecorder.nodes.BaseNode.fn`\ s) that contain recordable information
         nodes (dict):           a mapping of `~torchrecorder.nodes.BaseNode.fn`\ s
-                                to their corresponding `~torchrecorder.nodes.BaseNode`\ s
-        fn_types (dict):      a count of `~torchrecorder.nodes.BaseNode.fn`\ s by type for naming
+                                to their corresponding `~torchrecorder.nodes.BaseNode`\ s,
+                                or a `~torchrecorder.store.NodeStore` (see `compact`)
+        fn_types (dict):      a count of `~torchrecorder.nodes.BaseNode.fn`\ s by type for naming;
+                                `~torchrecorder.nodes.LayerNode`\ s are counted under
+                                ``(LayerNode, typename)``\ , apart from the ops named
+                                after a module class (see `torchrecorder.fx.trace`)
         edges   (set(tuple)):   a set of edges, each a pair of `~torchrecorder.nodes.BaseNode.fn`\ s
+                                and the time in seconds (see `clock`) when it was recorded
+        events  (list(tuple)):  a ``(fn, begin, end)`` event for each call of a
+                                `~torchrecorder.nodes.LayerNode`\ , and of each
+                                `~torchrecorder.nodes.OpNode` with the ``"dispatch"``
+                                backend, in nanoseconds of `clock`
+                                (see `torchrecorder.trace.write_trace`)
+        render_cache (dict):    preprocessing results shared by renderers of this recording,
+                                cleared whenever the recording changes
+        profiling (bool):       if `True`, the hooks only time each
+                                `~torchrecorder.nodes.LayerNode` (see `profile_passes`)
+        memory (bool):          if `True`, the hooks also store the following
+                                ``stats`` for each `~torchrecorder.nodes.LayerNode`:
+
+                                * ``"param_bytes"``: size of its own parameters
+                                * ``"act_bytes"``: size of its outputs
+                                * ``"peak_bytes"``: peak size of live activations
+                                  during its ``forward``, including the inputs.
+                                  Taken from the CUDA allocator for CUDA inputs.
+                                  Otherwise it is estimated as the size of every
+                                  output produced inside ``forward``, an upper
+                                  bound since frees cannot be observed.
+        zero_copy (bool):       if `True`, the hooks pass tensors through
+                                unchanged instead of copying them at module
+                                boundaries (see `prehook`)
+        aliases (dict):         with `zero_copy`, maps ``grad_fn``\ s to the
+                                recorded tensors that they produced, so that
+                                edges are drawn from those tensors
+        max_record_depth (int): if not `None`, the submodules at this depth
+                                are opaque (see `register_hooks`)
+        opaque (callable):      if not `None`, called with the qualified name
+                                and each submodule, to check if the submodule
+                                is opaque (see `register_hooks`)
+        global_hooks (bool):    if `True`, a single pair of global hooks is
+                                registered for all modules, instead of a pair
+                                of hooks per `~torchrecorder.nodes.LayerNode`
+                                (see `register_hooks`)
     """
 
     def __init__(self):
@@ -32,8 +75,24 @@ class Recorder(object):
         self.fn_types = dict()
         self.fn_set = set()
         self.edges = set()
-
+        self.events = []
+        self.render_cache = dict()
+        self.profiling = False
+        self.memory = False
+        self.zero_copy = False
+        self.aliases = dict()
+        self.max_record_depth = None
+        self.opaque = None
+        self.global_hooks = False
+
+        self._alias_frames = []
+        self._by_id = dict()
+        self._global_handles = []
         self._start_time = None
+        self._event_frames = []
+        self._timer = FrameTimer()
+        self._mem_frames = []
+        self._act_bytes = 0
         self._create_context()
 
     def add_node(self, net, depth=0, parent=None, name=None):
@@ -55,40 +114,100 @@ class Recorder(object):
 
         """
         classname = type(net).__name__
-        if self.fn_types.get(classname):
-            self.fn_types[classname] += 1
-        else:
-            self.fn_types[classname] = 1
-
-        if name is None:
-            objname = classname
-            if self.fn_types[classname] > 1:
-                objname = objname + "-" + str(self.fn_types[classname])
-        else:
-            objname = name
-
         if isinstance(net, Module):
-            if depth > 0 and name is not None:
-                objname = objname + "\n(" + classname + ")"
-            x = LayerNode(name=objname, fn=net, parent=parent, depth=depth)
-
-            x.pre = net.register_forward_pre_hook(partial(prehook, rec=self, node=x))
-            x.post = net.register_forward_hook(partial(posthook, rec=self, node=x))
-            # x.back = net.register_backward_hook(partial(backhook, rec=self, node=x))
+            kind = LayerNode
         elif "Tensor" in classname:
-            x = TensorNode(name=objname, fn=net, parent=parent, depth=depth)
+            kind = TensorNode
         elif "Parameter" in classname:
-            x = ParamNode(name=objname, fn=net, parent=parent, depth=depth)
+            kind = ParamNode
         elif hasattr(net, "next_functions"):
-            x = OpNode(name=objname, fn=net, parent=parent, depth=depth)
+            kind = OpNode
         else:
             raise RuntimeError("Cannot create node for " + str(net))
 
-        self.nodes[net] = x
-        self.fn_set.add(net)
+        x = self.insert(net, kind, depth, parent, name, classname)
+        if kind is LayerNode and self.global_hooks:
+            self._by_id[id(net)] = x
+        elif kind is LayerNode:
+            x.pre = net.register_forward_pre_hook(partial(prehook, rec=self, node=x))
+            x.post = net.register_forward_hook(partial(posthook, rec=self, node=x))
+
+    def insert(self, fn, kind, depth=0, parent=None, name=None, typename=None):
+        """Construct a node of a given kind, without registering any hooks.
+
+        Used by `add_node`, and by backends that do not record via hooks
+        (see `torchrecorder.fx.trace`).
+
+        Args:
+            fn :        object stored as the ``fn`` of the node, also its key in ``nodes``
+            kind :      a subclass of `~.nodes.BaseNode`
+            depth :     The scope depth at which ``fn`` is found
+            parent :    The object as part of which ``fn`` will be run
+            name :      a name to recognize the object during rendering, defaults to ``typename``
+            typename :  type of ``fn`` used for naming, defaults to its class name
+                        (or its ``typename``, for a `~.nodes.FnSummary`)
+
+        Returns:
+            the new `~.nodes.BaseNode`
+
+        """
+        classname = typename
+        if classname is None:
+            classname = getattr(fn, "typename", None) or type(fn).__name__
+        counter = (LayerNode, classname) if kind is LayerNode else classname
+        if self.fn_types.get(counter):
+            self.fn_types[counter] += 1
+        else:
+            self.fn_types[counter] = 1
+
+        if name is None:
+            objname = classname
+            if self.fn_types[counter] > 1:
+                objname = objname + "-" + str(self.fn_types[counter])
+        else:
+            objname = name
+        if kind is LayerNode and depth > 0 and name is not None:
+            objname = objname + "\n(" + classname + ")"
+
+        x = kind(name=objname, fn=fn, parent=parent, depth=depth)
+        self.nodes[fn] = x
+        self.fn_set.add(fn)
+        self.render_cache.clear()
         if x.parent is not None:
             pnode = self.nodes[x.parent]
-            pnode.subnets.add(net)
+            pnode.subnets.add(fn)
+        return x
+
+    def insert_layers(self, net, depth=0, parent=None, name=None, qualname=""):
+        """Insert a `~.nodes.LayerNode` for ``net`` and each of its submodules.
+
+        Used by the backends that do not record via hooks, in place of
+        `register_hooks`\ . The nodes are inserted in the order of
+        `torch.nn.Module.named_modules`\ , with their ``qualname`` and
+        ``signature`` set.
+
+        Args:
+            net :       a `torch.nn.Module`
+            depth :     The scope depth at which ``net`` is found
+            parent :    The object as part of which ``net`` will be run
+            name :      a name to recognize ``net`` during rendering
+            qualname :  qualified name of ``net``
+
+        Returns:
+            `None`
+
+        """
+        stack = [(net, depth, parent, name, qualname)]
+        while len(stack) != 0:
+            module, depth, parent, name, qualname = stack.pop()
+            x = self.insert(module, LayerNode, depth, parent, name)
+            x.qualname = qualname
+            x.signature = module_signature(module)
+            children = []
+            for n, child in module.named_children():
+                q = qualname + "." + n if qualname else n
+                children.append((child, depth + 1, module, n, q))
+            stack.extend(reversed(children))
 
     def add_dummy(self, dummy, fn):
         """Point to an existing node to assist recording.
@@ -104,6 +223,7 @@ class Recorder(object):
         """
         self.fn_set.add(dummy)
         self.nodes[dummy] = self.nodes[fn]
+        self.render_cache.clear()
 
     def add_edge(self, _from, _to):
         """Construct an edge of the recording graph.
@@ -117,34 +237,73 @@ class Recorder(object):
         """
         if _from is None or _to is None:
             raise AssertionError("Cannot draw edge involving" + str((_from, _to)))
-        if self._start_time is not None:
-            timestamp = time.time() - self._start_time
-        else:
-            timestamp = 0
-            self._start_time = time.time()
-        edge = (_from, _to, round(timestamp, 6))
+        edge = (_from, _to, round(self.clock() / 1e9, 6))
         self.edges.add(edge)
+        self.render_cache.clear()
+
+    def clock(self):
+        """Nanoseconds since the first call, from the monotonic `time.perf_counter_ns`."""
+        now = time.perf_counter_ns()
+        if self._start_time is None:
+            self._start_time = now
+        return now - self._start_time
 
-    def register_hooks(self, net, depth=0, parent=None, name=None):
+    def add_event(self, fn, begin, end):
+        """Record that the node of ``fn`` ran from ``begin`` to ``end``\ , in nanoseconds of `clock`."""
+        self.events.append((fn, begin, end))
+
+    def register_hooks(self, net, depth=0, parent=None, name=None, qualname=""):
         """Register the hooks of the `.Recorder` recursively on
         a `torch.nn.Module`\ .
 
         The hooks registered are `~functools.partial` versions
         of `prehook` and `posthook` corresponding to each node.
 
+        With `global_hooks`, the hooks are instead registered once with
+        `torch.nn.modules.module.register_module_forward_pre_hook` and
+        `torch.nn.modules.module.register_module_forward_hook`\ , and each
+        call looks up the `~torchrecorder.nodes.LayerNode` of the module by
+        its `id`\ ; calls of modules that were not added are ignored.
+
+        Submodules at `max_record_depth`\ , or for which `opaque` returns
+        `True`\ , are marked as ``opaque``\ : their own submodules are not
+        hooked, and the hooks of the submodule skip the operations inside it
+        (see `posthook`). Their ``signature`` covers the submodules within.
+
         Args:
             net (`~torch.nn.Module`\ ):
             depth (int):
             parent (`torch.nn.Module`\ ): the parent of ``net``
             name (str): name of ``net``
+            qualname (str): qualified name of ``net`` within the recorded network
 
         Returns:
             `None`
 
         """
+        if self.global_hooks and len(self._global_handles) == 0:
+            from torch.nn.modules.module import (
+                register_module_forward_pre_hook,
+                register_module_forward_hook,
+            )
+
+            pre = partial(_global_prehook, rec=self)
+            post = partial(_global_posthook, rec=self)
+            self._global_handles.append(register_module_forward_pre_hook(pre))
+            self._global_handles.append(register_module_forward_hook(post))
         self.add_node(net, depth, parent, name)
+        node = self.nodes[net]
+        node.qualname = qualname
+        max_depth = self.max_record_depth
+        node.opaque = max_depth is not None and depth >= max_depth
+        if not node.opaque and self.opaque is not None:
+            node.opaque = bool(self.opaque(qualname, net))
+        node.signature = module_signature(net, recurse=node.opaque)
+        if node.opaque:
+            return
         for n, x in net.named_children():
-            self.register_hooks(x, depth=depth + 1, parent=net, name=n)
+            q = qualname + "." + n if qualname else n
+            self.register_hooks(x, depth=depth + 1, parent=net, name=n, qualname=q)
 
     def remove_hooks(self):
         """Remove hooks from any `~torch.nn.Module`\ s in
@@ -152,12 +311,172 @@ class Recorder(object):
 
         After the recording is completed, the hooks in
         `~torchrecorder.nodes.LayerNode`\ s are unnecessary.
-        They are removed to prevent any possible issues.
+        They are removed to prevent any possible issues. With `global_hooks`,
+        only the two global hooks are removed.
         """
-        for node in set(self.nodes.values()):
+        if self.global_hooks:
+            for handle in self._global_handles:
+                handle.remove()
+            self._global_handles = []
+            self._by_id = dict()
+        else:
+            for node in set(self.nodes.values()):
+                if isinstance(node, LayerNode) and node.pre is not None:
+                    node.pre.remove()
+                    node.post.remove()
+        self.aliases.clear()
+        self._alias_frames = []
+        self._event_frames = []
+
+    def profile_passes(self, run, passes):
+        """Time every hooked `~torchrecorder.nodes.LayerNode` over repeated passes.
+
+        While ``run`` is called ``passes`` times, the hooks skip recording and
+        only measure each ``forward`` with `time.perf_counter_ns`. The time
+        spent inside the hooks themselves is subtracted. The results are
+        stored in the ``stats`` of each `~torchrecorder.nodes.LayerNode` as
+        means per pass:
+
+        * ``"time_incl"``: nanoseconds spent in ``forward``
+        * ``"time_excl"``: ``"time_incl"`` minus that of hooked submodules
+        * ``"calls"``: number of calls
+
+        Args:
+            run:            a callable running a forward pass of the network
+            passes (int):   number of passes to time
+
+        Returns:
+            `None`
+        """
+        layers = set(x for x in self.nodes.values() if isinstance(x, LayerNode))
+        for x in layers:
+            for k in ("time_incl", "time_excl", "calls"):
+                x.stats[k] = 0
+        self.profiling = True
+        try:
+            for _ in range(passes):
+                run()
+        finally:
+            self.profiling = False
+            self._timer.clear()
+        for x in layers:
+            for k in ("time_incl", "time_excl", "calls"):
+                x.stats[k] /= passes
+
+    def time_backward(self, outputs):
+        """Run backward from ``outputs``\ , timing every recorded ``grad_fn``\ .
+
+        Each recorded ``grad_fn`` gets a pre-hook and a hook for the duration
+        of the backward pass, and the following are stored in the ``stats``
+        of the node it belongs to (an `~torchrecorder.nodes.OpNode`\ , or the
+        tensor or parameter node of an ``AccumulateGrad``\ ):
+
+        * ``"grad_time"``: nanoseconds spent computing its gradients
+        * ``"grad_order"``: its position in the order in which backward ran
+
+        The autograd graph must be connected across module boundaries, as with
+        `zero_copy`\ . On CUDA the device is synchronized after each
+        ``grad_fn``\ , so the times are not hidden by asynchronous kernels.
+        The ``.grad`` of the parameters and inputs is set aside during the
+        pass and put back afterwards, so the network is left as it was.
+
+        Args:
+            outputs (list(`torch.Tensor`)): outputs of the recorded pass; the
+                            gradient of each is taken to be all ones
+
+        Returns:
+            `None`
+        """
+        outputs = [y for y in outputs if y.requires_grad]
+        sync = any(y.is_cuda for y in outputs)
+        state = [0, dict()]  # backward order, start times
+        leaves = dict()
+        for k in self.nodes:
+            x = getattr(k, "variable", k)  # the tensor of an AccumulateGrad
+            if isinstance(x, Tensor) and x.is_leaf and id(x) not in leaves:
+                leaves[id(x)] = (x, x.grad)
+                x.grad = None
+        handles = []
+        for k, node in list(self.nodes.items()):
+            if not hasattr(k, "register_prehook"):
+                continue
+            pre = partial(_grad_prehook, gf=k, node=node, state=state)
+            post = partial(_grad_posthook, gf=k, node=node, state=state, sync=sync)
+            handles.append(k.register_prehook(pre))
+            handles.append(k.register_hook(post))
+        try:
+            autograd.backward(outputs, [ones_like(y) for y in outputs])
+        finally:
+            for h in handles:
+                h.remove()
+            for x, grad in leaves.values():
+                x.grad = grad
+
+    def stable_ids(self):
+        """Number the recorded nodes in the order they were added.
+
+        Returns:
+            a `dict` mapping every key of ``nodes`` to the `int` id of its
+            `~torchrecorder.nodes.BaseNode`\ ; dummies share the id of the
+            node they point to, and the context stays mapped to `None`.
+        """
+        if isinstance(self.nodes, NodeStore):
+            # the ids are the keys, and there are no dummies
+            return dict((k, k) for k in self.nodes)
+        order = dict()
+        ids = {None: None}
+        for fn, node in self.nodes.items():
+            if fn is not None:
+                ids[fn] = order.setdefault(id(node), len(order))
+        return ids
+
+    def compact(self, columnar=False):
+        """Release the tensors and ops referenced by the recording graph.
+
+        Re-keys ``nodes``, ``fn_set``, ``edges``\ , ``events`` and the ``parent``/``subnets``
+        of each node with the ids from `stable_ids`, and replaces the ``fn`` of
+        every non-`~torchrecorder.nodes.LayerNode` with a
+        `~torchrecorder.nodes.FnSummary`\ . The `torch.nn.Module`\ s are kept.
+
+        Args:
+            columnar (bool, optional): store ``nodes`` in a
+                    `~torchrecorder.store.NodeStore` and ``edges`` in an
+                    `~torchrecorder.store.EdgeStore`\ , which take a fraction
+                    of the memory; ``fn_set`` is then the
+                    `~torchrecorder.store.NodeStore` itself. A columnar
+                    recording stays columnar when compacted again, and cannot
+                    be recorded into. Default `False`.
+
+        Returns:
+            `None`
+        """
+        columnar = columnar or isinstance(self.nodes, NodeStore)
+        ids = self.stable_ids()
+        nodes = OrderedDict()
+        for fn, node in self.nodes.items():
+            key = ids[fn]
+            if key in nodes:
+                continue
+            nodes[key] = node
+            node.parent = ids[node.parent]
             if isinstance(node, LayerNode):
-                node.pre.remove()
-                node.post.remove()
+                node.subnets = set(ids[s] for s in node.subnets)
+                node.boundary = [
+                    [[ids[x] for x in xs] if xs is not None else None for xs in b]
+                    for b in node.boundary
+                ]
+            elif node.fn is not None and not isinstance(node.fn, FnSummary):
+                node.fn = FnSummary.of(node.fn)
+        if columnar:
+            self.nodes = NodeStore.from_nodes(nodes)
+            self.edges = EdgeStore(sorted((ids[x], ids[y], z) for x, y, z in self.edges))
+            self.fn_set = self.nodes
+        else:
+            self.edges = set((ids[x], ids[y], z) for x, y, z in self.edges)
+            self.nodes = nodes
+            self.fn_set = set(nodes)
+        self.events = [(ids[x], b, e) for x, b, e in self.events]
+        self.render_cache.clear()
 
     def _create_context(self):
         """Construct a dummy node as the context for the recording graph.
@@ -174,15 +493,58 @@ class Recorder(object):
         self.nodes[None] = BaseNode(fn=None, depth=-1, parent=None, name="ContextDummy")
 
 
+def module_signature(module, recurse=False):
+    """Digest of the structure of a `torch.nn.Module`\ , excluding its submodules.
+
+    Covers the class of ``module`` and the code of its ``forward``, its
+    ``extra_repr`` and plain attributes (like ``training``), the shapes and dtypes
+    of its own parameters and buffers, and the names of its children. The
+    values of parameters and buffers are not covered.
+
+    Args:
+        module (`torch.nn.Module`):
+        recurse (bool, optional): if `True`, combine the signatures of
+                    ``module`` and all its submodules. Default `False`.
+
+    Returns:
+        a hexadecimal `str`
+    """
+    if recurse:
+        parts = [(q, module_signature(x)) for q, x in module.named_modules()]
+        return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+    cls = type(module)
+    parts = [cls.__module__, cls.__qualname__, module.extra_repr()]
+    code = getattr(cls.forward, "__code__", None)
+    if code is not None:
+        consts = tuple(c for c in code.co_consts if not hasattr(c, "co_code"))
+        parts.append((code.co_code, consts, code.co_names))
+    plain = (bool, int, float, str, tuple, type(None))
+    for k, v in sorted(vars(module).items()):
+        if not k.startswith("_") and isinstance(v, plain):
+            parts.append((k, v))
+    # the dicts are read directly, named_parameters() and co. are much slower
+    for n, p in module._parameters.items():
+        if p is not None:
+            parts.append((n, tuple(p.shape), str(p.dtype), p.requires_grad))
+    for n, b in module._buffers.items():
+        if b is not None:
+            parts.append((n, tuple(b.shape), str(b.dtype)))
+    parts.append(tuple(n for n, x in module._modules.items() if x is not None))
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
 def op_acc(gf, rec, node):
     """Operator Accumulator.
 
     Creates an `~.nodes.OpNode` to record the newly-performed operation ``gf``, if not
     already recorded. If ``gf`` is an initialization op (``AccumulateGradient``),
     then points ``gf`` to its connected `torch.Tensor` instead of creating an
-    `~.nodes.OpNode`. Otherwise recursively checks all operations that are connected to
+    `~.nodes.OpNode`. Otherwise checks all operations that are connected to
     ``gf`` and adds them if necessary.
 
+    The operations are walked depth-first with an explicit stack, so long
+    chains of operations do not hit Python's recursion limit.
+
     Args:
         gf:    current operation, a ``grad_fn`` object obtained from a `torch.Tensor`
         rec:   a `~.Recorder` object whose nodes are updated
@@ -192,17 +554,68 @@ def op_acc(gf, rec, node):
         `None`
 
     """
+    inputs = _op_visit(gf, rec, node)
+    if inputs is None:
+        return
+    stack = [(gf, inputs)]
+    while len(stack) != 0:
+        op, inputs = stack[-1]
+        for x, _ in inputs:
+            if x is None:
+                continue
+            x_inputs = _op_visit(x, rec, node)
+            if x_inputs is not None:
+                stack.append((x, x_inputs))
+                break
+            rec.add_edge(_from=rec.aliases.get(x, x), _to=op)
+        else:
+            stack.pop()
+            if len(stack) != 0:
+                rec.add_edge(_from=op, _to=stack[-1][0])
+
+
+def _op_visit(gf, rec, node):
+    """Record ``gf`` if necessary, for `op_acc`.
+
+    Returns:
+        an iterator over ``gf.next_functions`` if a new `~.nodes.OpNode`
+        was created for ``gf``, `None` otherwise.
+    """
     if gf in rec.fn_set:
-        pass
-    else:
-        if hasattr(gf, "variable"):
-            rec.add_dummy(dummy=gf, fn=gf.variable)
-        elif hasattr(gf, "next_functions"):
-            rec.add_node(gf, node.depth + 1, node.fn)
-            for x, y in gf.next_functions:
-                if x is not None:
-                    op_acc(x, rec, node)
-                    rec.add_edge(_from=x, _to=gf)
+        return None
+    if hasattr(gf, "variable"):
+        rec.add_dummy(dummy=gf, fn=gf.variable)
+    elif hasattr(gf, "next_functions"):
+        rec.add_node(gf, node.depth + 1, node.fn)
+        return iter(gf.next_functions)
+    return None
+
+
+def opaque_acc(gf, rec, node):
+    """Opaque Operator Accumulator.
+
+    Creates an `~.nodes.OpNode` for ``gf``\ , an operation returning an output of
+    the opaque ``node``, without walking the operations before it. Instead,
+    the inputs of the current call of ``node.fn`` and all its parameters are
+    connected to ``gf``\ , so the cost of recording ``node.fn`` does not depend
+    on what it contains.
+
+    Args:
+        gf:    a ``grad_fn`` object obtained from an output of ``node.fn``
+        rec:   a `~.Recorder` object whose nodes are updated
+        node:  an opaque `~.nodes.LayerNode`
+
+    Returns:
+        `None`
+
+    """
+    if gf is None or gf in rec.fn_set:
+        return
+    rec.add_node(gf, node.depth + 1, node.fn)
+    for x in node.boundary[-1][0]:
+        rec.add_edge(_from=x, _to=gf)
+    for param in node.fn.parameters():
+        rec.add_edge(_from=param, _to=gf)
 
 
 def tensor_acc(tensor, rec, node):
@@ -278,6 +691,12 @@ def prehook(module, inputs, rec, node):
     previous ``module``. The ``inputs`` are then converted to leaf tensors and
     recorded before being passed off to the ``module``.
 
+    With `~.Recorder.zero_copy`, only leaf ``inputs`` are copied; the others
+    are passed through unchanged, and their ``grad_fn``\ s are aliased to
+    them in `~.Recorder.aliases` until the `posthook` of ``module``\ . This
+    avoids allocating a copy of each activation at every module boundary,
+    and keeps the autograd graph connected.
+
     Args:
         module:     a `torch.nn.Module`
         inputs:     a `torch.Tensor` or a `tuple` of `torch.Tensor`\ s
@@ -289,20 +708,35 @@ def prehook(module, inputs, rec, node):
         the ``leaf``-equivalent of ``inputs``.
 
     """
-    for name, param in module.named_parameters(recurse=False):
+    if rec.profiling:
+        return _profile_prehook(rec, node)
+    for name, param in module.named_parameters(recurse=node.opaque):
         param_acc(param, rec, node)
         if name is not None and name != "":
             rec.nodes[param].name = name
     is_singleton = not isinstance(inputs, tuple)
     a = [inputs] if is_singleton else inputs  # same input appearing multiple times?
     new_inputs = []
+    aliased = []
     for x in a:
         gf = x.grad_fn
         op_acc(gf, rec, rec.nodes[node.parent])
         tensor_acc(x, rec, node)
-        if gf is not None:
+        if gf is not None and gf not in rec.aliases:
             rec.add_edge(_from=gf, _to=x)
-        new_inputs.append(leaf_dummy(x, rec))
+        if rec.zero_copy and not x.is_leaf:
+            if gf not in rec.aliases:
+                rec.aliases[gf] = x
+                aliased.append(gf)
+            new_inputs.append(x)
+        else:
+            new_inputs.append(leaf_dummy(x, rec))
+    if rec.zero_copy:
+        rec._alias_frames.append(aliased)
+    node.boundary.append([[rec.nodes[x].fn for x in a], None])
+    if rec.memory:
+        _memory_prehook(module, a, rec, node)
+    rec._event_frames.append(rec.clock())
     return new_inputs[0] if is_singleton else tuple(new_inputs)
 
 
@@ -315,6 +749,17 @@ def posthook(module, inputs, outputs, rec, node):
     `posthook` would execute first!). If necessary, the ``outputs`` are
     converted to leaf tensors to record operations afresh.
 
+    With `~.Recorder.zero_copy`, the ``outputs`` are returned unchanged, and
+    their ``grad_fn``\ s are aliased to the recorded tensors in
+    `~.Recorder.aliases`\ .
+
+    If ``node`` is opaque, the operations inside ``module`` are not walked;
+    only the ``grad_fn`` of each output is recorded (see `opaque_acc`).
+
+    The call is then added to `~.Recorder.events`\ , ending after the
+    operations found here. The operations themselves get no events, since
+    autograd does not time them.
+
     Args:
         module:     a `torch.nn.Module`
         inputs:     a `torch.Tensor` or a tuple of `torch.Tensor`\ s
@@ -327,28 +772,181 @@ def posthook(module, inputs, outputs, rec, node):
         the ``leaf``-equivalent of ``outputs``.
 
     """
+    if rec.profiling:
+        return _profile_posthook(rec, node)
     is_singleton = not isinstance(outputs, tuple)
     b = [outputs] if is_singleton else outputs
+    if rec.memory:
+        _memory_posthook(b, rec, node)
     new_outputs = []
+    recorded = []
+    aliases = dict()
+    acc = opaque_acc if node.opaque else op_acc
     for x in b:
         gf = x.grad_fn
         if gf not in rec.fn_set:
+            if rec.zero_copy:
+                # an in-place op returns an already recorded tensor,
+                # so a detached view of it is recorded instead
+                y = x if x not in rec.fn_set else x.detach()
+                tensor_acc(y, rec, node)
+                acc(gf, rec, node)
+                rec.add_edge(gf, y)
+                aliases[gf] = y
+                recorded.append(y)
+                new_outputs.append(x)
+                continue
             x = x.detach()
             x.requires_grad = True
             tensor_acc(x, rec, node)
-            op_acc(gf, rec, node)
+            acc(gf, rec, node)
             rec.add_edge(gf, x)
+            recorded.append(x)
             new_outputs.append(leaf_dummy(x, rec))
         else:
             # if the op has already been recorded
-            # it has to be a dummy op
-            rec.nodes[gf].parent = node.parent
-            rec.nodes[gf].depth -= 1
-            if rec.nodes[gf].fn in node.subnets:
-                node.subnets.remove(rec.nodes[gf].fn)
+            # it has to be a dummy op (or an aliased one)
+            y = rec.nodes[rec.aliases.get(gf, gf)]
+            y.parent = node.parent
+            y.depth -= 1
+            if y.fn in node.subnets:
+                node.subnets.remove(y.fn)
+            recorded.append(y.fn)
             new_outputs.append(x)
+    if rec.zero_copy:
+        for gf in rec._alias_frames.pop():
+            del rec.aliases[gf]
+        rec.aliases.update(aliases)
+    node.boundary[-1][1] = recorded
+    rec.add_event(module, rec._event_frames.pop(), rec.clock())
     return new_outputs[0] if is_singleton else tuple(new_outputs)
 
 
-def backhook(module, grad_inputs, grad_outputs, rec, node):
-    pass
+def _global_prehook(module, inputs, rec):
+    """`prehook` for any module, for `Recorder.global_hooks`."""
+    node = rec._by_id.get(id(module))
+    if node is not None:
+        return prehook(module, inputs, rec, node)
+
+
+def _global_posthook(module, inputs, outputs, rec):
+    """`posthook` for any module, for `Recorder.global_hooks`."""
+    node = rec._by_id.get(id(module))
+    if node is not None:
+        return posthook(module, inputs, outputs, rec, node)
+
+
+def tensor_bytes(tensor):
+    """Size of the data of ``tensor`` in bytes, computed from its shape and dtype."""
+    return tensor.numel() * tensor.element_size()
+
+
+def _memory_prehook(module, inputs, rec, node):
+    """Start measuring the memory used by ``node``, for `Recorder.memory`."""
+    params = module.parameters(recurse=node.opaque)
+    node.stats["param_bytes"] = sum(tensor_bytes(p) for p in params)
+    device = inputs[0].device if len(inputs) != 0 else None
+    frame = [device, rec._act_bytes, sum(tensor_bytes(x) for x in inputs), None, 0]
+    if device is not None and device.type == "cuda":
+        frame[3] = cuda.memory_allocated(device)
+        if len(rec._mem_frames) != 0:
+            outer = rec._mem_frames[-1]
+            outer[4] = max(outer[4], cuda.max_memory_allocated(device))
+        cuda.reset_peak_memory_stats(device)
+    rec._mem_frames.append(frame)
+
+
+def _memory_posthook(outputs, rec, node):
+    """Stop measuring the memory used by ``node``, for `Recorder.memory`."""
+    act = sum(tensor_bytes(x) for x in outputs)
+    rec._act_bytes += act
+    device, act_before, input_bytes, allocated, inner_peak = rec._mem_frames.pop()
+    if allocated is not None:
+        peak = max(inner_peak, cuda.max_memory_allocated(device))
+        if len(rec._mem_frames) != 0:
+            outer = rec._mem_frames[-1]
+            outer[4] = max(outer[4], peak)
+        cuda.reset_peak_memory_stats(device)
+        peak_bytes = input_bytes + peak - allocated
+    else:
+        peak_bytes = input_bytes + rec._act_bytes - act_before
+    node.stats["act_bytes"] = node.stats.get("act_bytes", 0) + act
+    node.stats["peak_bytes"] = max(node.stats.get("peak_bytes", 0), peak_bytes)
+
+
+class FrameTimer(object):
+    """Time nested calls from hooks, leaving out the time spent in the hooks.
+
+    A pre-hook reads `time.perf_counter_ns` as it starts, does its work and
+    calls `enter`; a post-hook reads the clock as it starts, calls `exit`,
+    does its work and calls `done`. The time between those points is hook
+    overhead, and is subtracted from every call still running. Used by
+    `Recorder.profile_passes` and `torchrecorder.sampling.Sampler`\ .
+
+    Attributes:
+        frames (list):      ``[begin, overhead, children]`` for each call
+                            currently running, innermost last
+        overhead (int):     nanoseconds spent in hooks so far
+    """
+
+    def __init__(self):
+        self.frames = []
+        self.overhead = 0
+
+    def enter(self, start):
+        """Start timing a call, whose pre-hook started at ``start``\ ."""
+        frame = [0, self.overhead, 0]
+        self.frames.append(frame)
+        frame[0] = time.perf_counter_ns()
+        self.overhead += frame[0] - start
+
+    def exit(self, end):
+        """Stop timing the innermost call, whose post-hook started at ``end``\ .
+
+        Returns:
+            a `tuple` of the inclusive and exclusive nanoseconds of the call
+        """
+        begin, overhead, children = self.frames.pop()
+        incl = end - begin - (self.overhead - overhead)
+        if len(self.frames) != 0:
+            self.frames[-1][2] += incl
+        return incl, incl - children
+
+    def done(self, end):
+        """Count the post-hook that started at ``end`` as overhead."""
+        self.overhead += time.perf_counter_ns() - end
+
+    def clear(self):
+        """Forget the calls still running, like those cut short by an exception."""
+        del self.frames[:]
+
+
+def _profile_prehook(rec, node):
+    """Start timing ``node``, for `Recorder.profile_passes`."""
+    rec._timer.enter(time.perf_counter_ns())
+
+
+def _profile_posthook(rec, node):
+    """Stop timing ``node``, for `Recorder.profile_passes`."""
+    end = time.perf_counter_ns()
+    incl, excl = rec._timer.exit(end)
+    node.stats["time_incl"] += incl
+    node.stats["time_excl"] += excl
+    node.stats["calls"] += 1
+    rec._timer.done(end)
+
+
+def _grad_prehook(grad_outputs, gf, node, state):
+    """Start timing ``gf``\ , for `Recorder.time_backward`."""
+    if "grad_order" not in node.stats:
+        node.stats["grad_order"] = state[0]
+        state[0] += 1
+    state[1][gf] = time.perf_counter_ns()
+
+
+def _grad_posthook(grad_inputs, grad_outputs, gf, node, state, sync):
+    """Stop timing ``gf``\ , for `Recorder.time_backward`."""
+    if sync:
+        cuda.synchronize()
+    elapsed = time.perf_counter_ns() - state[1].pop(gf)
+    node.stats["grad_time"] = node.stats.get("grad_time", 0) + elapsed
@@ -6,4 +6,5 @@
     :copyright: (c) 2020 by Gautham Venkatasubramanian.
     :license: see LICENSE for more details.
 """
-from .gv import GraphvizRenderer, GraphvizStyler
+from .gv import GraphvizRenderer, GraphvizStyler, HeatStyler
+from .dot import DotRenderer
@@ -8,8 +8,16 @@
     :param copyright: (c) 2020 by Gautham Venkatasubramanian.
     :param license: see LICENSE for more details.
 """
-from collections import OrderedDict
+from array import array
+from collections import Counter, OrderedDict
+from fnmatch import fnmatchcase
 from ..nodes import LayerNode
+from ..store import KINDS, NodeStore, EdgeStore
+
+try:
+    import numpy
+except ImportError:  # the preprocessing falls back to plain Python
+    numpy = None
 
 
 class BaseRenderer(object):
@@ -20,16 +28,29 @@ class BaseRenderer(object):
 
         rec (`~torchrecorder.recorder.Recorder`):
         render_depth (int): nodes having a greater depth than this value
-                            will not be rendered
+                            will not be rendered, unless they are in an
+                            expanded `~torchrecorder.nodes.LayerNode`
+        expand (frozenset): `fnmatch` patterns of the
+                            `~torchrecorder.nodes.LayerNode.qualname`\ s to
+                            be rendered in full, regardless of `.render_depth`
         processed (`collections.OrderedDict`):
                             An ``OrderedDict`` whose keys contain ``nodes`` and values
                             contain the corresponding (directed) edge lists
+        counts (dict):      maps each rendered edge ``(fnode, tnode)`` to the
+                            number of distinct recorded edges lifted onto it
+        edge_counts (bool): if `True`, renderers style edges by their
+                            ``counts`` (see
+                            `~torchrecorder.renderer.GraphvizStyler.style_weighted_edge`)
     """
 
-    def __init__(self, rec, render_depth=256):
+    def __init__(self, rec, render_depth=256, expand=None, edge_counts=False):
         self.rec = rec
         self.render_depth = render_depth
+        self.expand = frozenset() if expand is None else frozenset(expand)
+        self.edge_counts = edge_counts
+        self.expanded = None
         self.processed = OrderedDict()
+        self.counts = dict()
 
     def render_node(self, dest, node):
         raise NotImplementedError("Base Class")
@@ -54,6 +75,8 @@ class BaseRenderer(object):
             ``dest`` after updating with necessary information
         """
         self.processed.clear()
+        self.counts.clear()
+        self.expanded = self._cached("expanded", self._build_expanded)
         self._process_nodes()
         self._process_edges()
         while len(self.processed) != 0:
@@ -65,33 +88,260 @@ class BaseRenderer(object):
             self.processed.pop(node)
         return dest
 
+    def is_open(self, node):
+        """Check if the `~torchrecorder.nodes.LayerNode` ``node`` is to be
+        rendered along with its ``subnets``: either it is shallower than
+        `.render_depth`, or it is in, or leads to, an expanded subtree.
+        Opaque nodes are never open, since their insides were not recorded.
+        """
+        if node.opaque:
+            return False
+        return node.depth < self.render_depth or node in self.expanded
+
+    def is_visible(self, node):
+        """Check if ``node`` is to be rendered, i.e. its parent is open."""
+        parent = self.rec.nodes[node.parent]
+        return parent.fn is None or self.is_open(parent)
+
     def _process_nodes(self):
-        """Filter out nodes that have a greater depth than required.
+        """Filter out nodes that are not visible.
         """
-        for k, v in self.rec.nodes.items():
-            if k is not None and v.depth <= self.render_depth:
-                self.processed[v] = []
+        for v in self._cached("nodes", self._build_nodes):
+            self.processed[v] = []
 
     def _process_edges(self):
         """Construct necessary edges between filtered nodes.
 
-        After all nodes deeper than `.render_depth` have been removed, all the
+        After all nodes that are not visible have been removed, all the
         edges that between these nodes and those that remain must be
         transformed accordingly: such edges are "lifted up" for rendering, and
         ignored if they are internal to a node (i.e. both source and
-        destination have been removed).
+        destination have been removed). Edges lifted onto the same pair of
+        nodes are rendered once.
         """
-
-        def lifted_node(x):
-            xnode = self.rec.nodes[x]
-            while xnode.depth > self.render_depth:
-                xnode = self.rec.nodes[xnode.parent]
-            return xnode
-
-        lifted_edges = set(
-            (lifted_node(x), lifted_node(y), z)
-            for x, y, z in self.rec.edges
-            if lifted_node(x) != lifted_node(y)
-        )
-        for fnode, tnode, _ in lifted_edges:
+        for fnode, tnode, count in self._cached("edges", self._build_edges):
             self.processed[fnode].append(tnode)
+            self.counts[(fnode, tnode)] = count
+
+    def _cached(self, kind, build):
+        """Fetch a preprocessing result for `.render_depth` from ``rec.render_cache``.
+
+        If the result is not cached, it is computed by ``build`` and cached,
+        so that other renders of the same recording can reuse it. ``build`` is
+        passed the ``kind`` of result cached for the closest greater depth
+        (or `None`), because the result at a given depth can be derived from
+        the result at any greater depth.
+
+        Args:
+            kind (str):  one of ``"nodes"``, ``"lifted"`` or ``"edges"``
+            build:       a callable taking the result at a greater depth
+
+        Returns:
+            the cached result
+        """
+        cache = self.rec.render_cache
+        key = (kind, self.render_depth, self.expand)
+        if key not in cache:
+            depths = [
+                d
+                for k, d, e in cache
+                if k == kind and e == self.expand and d > self.render_depth
+            ]
+            deeper = None
+            if len(depths) != 0:
+                deeper = cache[(kind, min(depths), self.expand)]
+            cache[key] = build(deeper)
+        return cache[key]
+
+    def _lift(self, node):
+        """Return the closest ancestor of ``node`` (or ``node`` itself)
+        that is visible.
+        """
+        while not self.is_visible(node):
+            node = self.rec.nodes[node.parent]
+        return node
+
+    def _build_expanded(self, deeper=None):
+        """Construct the `set` of `~torchrecorder.nodes.LayerNode`\ s that match
+        `.expand`, along with their ancestors and descendants.
+        """
+        if len(self.expand) == 0:
+            return frozenset()
+        nodes = self.rec.nodes
+        if isinstance(nodes, NodeStore):
+            kind = KINDS.index(LayerNode)
+            n = len(nodes.kind)
+            layers = set(nodes[i] for i in range(n) if nodes.kind[i] == kind)
+        else:
+            layers = set(x for x in nodes.values() if isinstance(x, LayerNode))
+        matched = set()
+        for x in layers:
+            q = x.qualname
+            if q is not None and any(fnmatchcase(q, p) for p in self.expand):
+                matched.add(x)
+        expanded = set()
+        for x in layers:
+            path = []
+            y = x
+            while isinstance(y, LayerNode) and y not in matched:
+                path.append(y)
+                y = self.rec.nodes[y.parent]
+            if isinstance(y, LayerNode):
+                expanded.update(path)
+        for x in matched:
+            while isinstance(x, LayerNode) and x not in expanded:
+                expanded.add(x)
+                x = self.rec.nodes[x.parent]
+        return frozenset(expanded)
+
+    def _visible_ids(self):
+        """For a `~torchrecorder.store.NodeStore`\ , a callable checking
+        `.is_visible` by id straight from the columns.
+        """
+        store = self.rec.nodes
+        parent, depth, render_depth = store.parent, store.depth, self.render_depth
+        expanded = set(store.key_of(x) for x in self.expanded)
+        opaque = set(_opaque_ids(store))
+
+        def visible(i):
+            p = parent[i]
+            if p < 0:
+                return True
+            return (depth[p] < render_depth or p in expanded) and p not in opaque
+
+        return visible
+
+    def _visible_mask(self):
+        """For a `~torchrecorder.store.NodeStore`\ , a `numpy` mask of the
+        ids of the visible nodes.
+        """
+        store = self.rec.nodes
+        parent = numpy.frombuffer(store.parent, dtype=numpy.intc)
+        is_open = numpy.frombuffer(store.depth, dtype=numpy.intc) < self.render_depth
+        if len(self.expanded) != 0:
+            is_open[[store.key_of(x) for x in self.expanded]] = True
+        is_open[_opaque_ids(store)] = False
+        return (parent < 0) | is_open[parent]
+
+    def _build_nodes(self, deeper=None):
+        """Construct the `list` of nodes to be rendered, in recording order."""
+        if deeper is not None:
+            return [v for v in deeper if self.is_visible(v)]
+        if isinstance(self.rec.nodes, NodeStore):
+            store = self.rec.nodes
+            if numpy is not None:
+                ids = numpy.flatnonzero(self._visible_mask()).tolist()
+            else:
+                visible = self._visible_ids()
+                ids = [i for i in range(len(store.kind)) if visible(i)]
+            return [store[i] for i in ids]
+        nodes = OrderedDict()
+        for k, v in self.rec.nodes.items():
+            if k is not None and self.is_visible(v):
+                nodes[v] = None
+        return list(nodes)
+
+    def _build_lifted(self, deeper=None):
+        """Construct a `dict` mapping each key of ``rec.nodes`` to the node it
+        is lifted to.
+
+        Each chain of ancestors is walked only until it reaches a node that
+        has already been lifted, so every node is visited once. For a
+        `~torchrecorder.store.NodeStore`\ , the result is an `array.array`
+        mapping each id to the id it is lifted to.
+        """
+        nodes = self.rec.nodes
+        if isinstance(nodes, NodeStore):
+            return self._build_lifted_ids(deeper)
+        index = nodes if deeper is None else deeper
+        memo = dict()
+        for node in index.values():
+            path = []
+            x = node
+            while x not in memo and not self.is_visible(x):
+                path.append(x)
+                x = nodes[x.parent]
+            top = memo.get(x, x)
+            for p in path:
+                memo[p] = top
+        return dict((k, memo.get(v, v)) for k, v in index.items())
+
+    def _build_lifted_ids(self, deeper=None):
+        """`_build_lifted` for a `~torchrecorder.store.NodeStore`\ .
+
+        With `numpy`, every node starts at itself if visible, or else at its
+        parent, and all nodes jump to the node their target points at until
+        nothing moves; this takes a number of passes logarithmic in the depth
+        of the recording. The result is then a `numpy` array.
+        """
+        if numpy is not None:
+            parent = numpy.frombuffer(self.rec.nodes.parent, dtype=numpy.intc)
+            ids = numpy.arange(len(parent), dtype=numpy.intc)
+            lifted = numpy.where(self._visible_mask(), ids, parent)
+            while True:
+                jumped = lifted[lifted]
+                if numpy.array_equal(jumped, lifted):
+                    return lifted
+                lifted = jumped
+        parent = self.rec.nodes.parent
+        visible = self._visible_ids()
+        n = len(parent)
+        lifted = array("i", range(n)) if deeper is None else array("i", deeper)
+        memo = array("i", [-1]) * n
+        for i in range(n):
+            path = []
+            x = lifted[i]
+            while memo[x] < 0 and not visible(x):
+                path.append(x)
+                x = parent[x]
+            top = x if memo[x] < 0 else memo[x]
+            for p in path:
+                memo[p] = top
+            lifted[i] = top
+        return lifted
+
+    def _build_edges(self, deeper=None):
+        """Construct the `list` of lifted edges, without self-loops.
+
+        Each edge is a ``(fnode, tnode, count)`` `tuple`, where ``count`` is
+        the number of distinct recorded edges lifted onto it; the timestamps
+        of the recorded edges are ignored.
+        """
+        if deeper is not None:
+            counts = Counter()
+            for x, y, c in deeper:
+                counts[(self._lift(x), self._lift(y))] += c
+            return [(f, t, c) for (f, t), c in counts.items() if f is not t]
+        lifted = self._cached("lifted", self._build_lifted)
+        if not isinstance(self.rec.nodes, NodeStore):
+            pairs = set((x, y) for x, y, _ in self.rec.edges)
+            counts = Counter((lifted[x], lifted[y]) for x, y in pairs)
+            return [(f, t, c) for (f, t), c in counts.items() if f is not t]
+        store = self.rec.nodes
+        if numpy is None:
+            pairs = set((x, y) for x, y, _ in self.rec.edges)
+            counts = Counter((lifted[x], lifted[y]) for x, y in pairs)
+            return [(store[f], store[t], c) for (f, t), c in counts.items() if f != t]
+        # a pair of ids (x, y) is encoded as the single int64 x * n + y
+        n = len(store.kind)
+        edges = self.rec.edges
+        if isinstance(edges, EdgeStore):
+            src = numpy.frombuffer(edges.src, dtype=numpy.intc)
+            dst = numpy.frombuffer(edges.dst, dtype=numpy.intc)
+        else:
+            pairs = numpy.array([(x, y) for x, y, _ in edges], dtype=numpy.intc)
+            src, dst = pairs.reshape(-1, 2).T
+        pairs = numpy.unique(src.astype(numpy.int64) * n + dst)
+        f = lifted[pairs // n].astype(numpy.int64)
+        t = lifted[pairs % n]
+        keep = f != t
+        keys, counts = numpy.unique(f[keep] * n + t[keep], return_counts=True)
+        return [
+            (store[k // n], store[k % n], c)
+            for k, c in zip(keys.tolist(), counts.tolist())
+        ]
+
+
+def _opaque_ids(store):
+    """Ids of the opaque `~torchrecorder.nodes.LayerNode`\ s in a `~torchrecorder.store.NodeStore`."""
+    return [i for i, extra in store.extra.items() if extra.get("opaque")]
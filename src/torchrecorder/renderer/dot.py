@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+    torchrecorder.renderer.dot
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Streaming DOT renderer object
+
+    :param copyright: (c) 2020 by Gautham Venkatasubramanian.
+    :param license: see LICENSE for more details.
+"""
+import re
+from ..nodes import LayerNode
+from .base import BaseRenderer
+from .gv import GraphvizStyler
+
+_ID = re.compile(r"([a-zA-Z_][a-zA-Z0-9_]*|-?(\.[0-9]+|[0-9]+(\.[0-9]*)?))$")
+_KEYWORDS = {"node", "edge", "graph", "digraph", "subgraph", "strict"}
+_UNESCAPED_QUOTE = re.compile(r'(?<!\\)"')
+
+
+def quote(s):
+    """Quote ``s`` for use as a DOT identifier, as `graphviz` does."""
+    s = str(s)
+    if s.startswith("<") and s.endswith(">"):
+        return s
+    if _ID.match(s) and s.lower() not in _KEYWORDS:
+        return s
+    return '"' + _UNESCAPED_QUOTE.sub('\\"', s) + '"'
+
+
+def attr_list(attrs, label=None):
+    """Format ``attrs`` as a DOT attribute list, as `graphviz` does."""
+    items = [] if label is None else ["label=" + quote(label)]
+    items.extend(
+        "{}={}".format(quote(k), quote(v))
+        for k, v in sorted(attrs.items())
+        if v is not None
+    )
+    return " [" + " ".join(items) + "]" if len(items) != 0 else ""
+
+
+class DotRenderer(BaseRenderer):
+    """Render information from a `~torchrecorder.recorder.Recorder` as DOT text.
+
+    Unlike `.GraphvizRenderer`, no `graphviz.Digraph` objects are built: each
+    node, cluster and edge is written to the destination file-like object as
+    soon as it is visited. Edges that `.GraphvizRenderer` would place in an
+    enclosing graph are held back until the current cluster is closed.
+
+    Attributes:
+        styler (`class`): `.GraphvizStyler` or a subclass
+        graph_attr (dict): attributes of the top-level graph
+        node_attr (dict):  default attributes of the nodes
+        pending (list):    for each open graph, the edges waiting to be written into it
+    """
+
+    def __init__(
+        self,
+        rec,
+        render_depth=256,
+        styler_cls=None,
+        graph_attr=None,
+        node_attr=None,
+        expand=None,
+        edge_counts=False,
+        **styler_args
+    ):
+        BaseRenderer.__init__(self, rec, render_depth, expand, edge_counts)
+        if styler_cls is None:
+            styler_cls = GraphvizStyler
+        self.styler = styler_cls(**styler_args)
+        self.styler.prepare(rec)
+        self.graph_attr = dict() if graph_attr is None else graph_attr
+        self.node_attr = dict() if node_attr is None else node_attr
+        self.pending = []
+
+    def __call__(self, f):
+        """Write the recording as a DOT ``digraph`` into ``f``.
+
+        Args:
+            f:  a text file-like object with a ``write`` method
+
+        Returns:
+            ``f``
+        """
+        self.pending = [[]]
+        f.write("digraph {\n")
+        if len(self.graph_attr) != 0:
+            self._write(f, "graph" + attr_list(self.graph_attr))
+        if len(self.node_attr) != 0:
+            self._write(f, "node" + attr_list(self.node_attr))
+        BaseRenderer.__call__(self, f)
+        self._flush(f)
+        f.write("}\n")
+        return f
+
+    def render_node(self, f, node):
+        """Write a node as DOT.
+
+        If ``node`` is a `~torchrecorder.nodes.LayerNode`, checks
+        `.is_open` to see if its
+        `~.torchrecorder.nodes.LayerNode.subnets` have to rendered.
+
+        Args:
+            f:  a text file-like object
+            node (`~torchrecorder.nodes.BaseNode`):
+
+        """
+        if isinstance(node, LayerNode) and self.is_open(node):
+            self.render_recursive_node(f, node)
+        else:
+            style = self.styler.style_node(node)
+            label = style.pop("label", None)
+            self._write(f, str(id(node)) + attr_list(style, label))
+
+    def render_recursive_node(self, f, node):
+        """Write a `~torchrecorder.nodes.LayerNode` and its subnets as a DOT cluster.
+
+        Args:
+            f:  a text file-like object
+            node (`~torchrecorder.nodes.LayerNode`):
+
+        """
+        subg_style = self.styler.style_node(node)
+        subg_style["fillcolor"] = "white"
+        self._write(f, "subgraph cluster_" + str(id(node)) + " {")
+        self.pending.append([])
+        self._write(f, "graph" + attr_list(subg_style))
+        self._write(f, "node" + attr_list({"group": str(node.depth)}))
+        for s in node.subnets:
+            fnode = self.rec.nodes[s]
+            self.render_node(f, fnode)
+        for s in node.subnets:
+            fnode = self.rec.nodes[s]
+            for tnode in self.processed[fnode]:
+                if fnode.depth == tnode.depth:
+                    self.render_edge(f, fnode, tnode)
+                elif fnode.depth < tnode.depth:
+                    self.pending[-2].append((fnode, tnode))
+                else:
+                    depth_diff = fnode.depth - tnode.depth
+                    self.pending[-1 - depth_diff].append((fnode, tnode))
+            self.processed.pop(fnode)
+        self._flush(f)
+        self.pending.pop()
+        self._write(f, "}")
+        self._flush(f)
+
+    def render_edge(self, f, fnode, tnode):
+        """Write an edge as DOT.
+
+        Args:
+            f:  a text file-like object
+            fnode (`~torchrecorder.nodes.BaseNode`):
+            tnode (`~torchrecorder.nodes.BaseNode`):
+
+        """
+        if self.edge_counts:
+            count = self.counts[(fnode, tnode)]
+            style = self.styler.style_weighted_edge(fnode, tnode, count)
+        else:
+            style = self.styler.style_edge(fnode, tnode)
+        line = str(id(fnode)) + " -> " + str(id(tnode)) + attr_list(style)
+        self._write(f, line)
+
+    def _flush(self, f):
+        """Write the edges held back for the innermost open graph."""
+        edges = self.pending[-1]
+        for fnode, tnode in edges:
+            self.render_edge(f, fnode, tnode)
+        del edges[:]
+
+    def _write(self, f, line):
+        f.write("\t" * len(self.pending) + line + "\n")
@@ -8,7 +8,9 @@
     :param copyright: (c) 2020 by Gautham Venkatasubramanian.
     :param license: see LICENSE for more details.
 """
+import math
 from ..nodes import BaseNode, TensorNode, ParamNode, OpNode, LayerNode
+from ..stats import stat_max
 from .base import BaseRenderer
 from graphviz import Digraph
 
@@ -37,6 +39,19 @@ class GraphvizStyler(object):
             LayerNode: dict(**styler_args, fillcolor="lightgrey", shape="box"),
         }
 
+    def prepare(self, rec):
+        """Called by the renderers with the recording ``rec`` before any styling.
+
+        Can be overridden to compute styles that depend on the whole recording.
+
+        Args:
+            rec (`~torchrecorder.recorder.Recorder`):
+        Returns:
+            `None`
+
+        """
+        pass
+
     def style_node(self, node):
         """Construct style properties for the given node.
 
@@ -68,6 +83,76 @@ class GraphvizStyler(object):
         """
         return {}
 
+    def style_weighted_edge(self, fnode, tnode, count):
+        """Construct style properties for an edge that stands for ``count``
+        recorded edges.
+
+        Used instead of `style_edge` when the renderer is given
+        ``edge_counts=True``. Edges standing for more than one recorded edge
+        are drawn thicker, and weighted to be kept short.
+
+        Args:
+            fnode: `~torchrecorder.nodes.BaseNode`
+            tnode: `~torchrecorder.nodes.BaseNode`
+            count (int): number of distinct recorded edges lifted onto this one
+
+        Returns:
+            a `dict` containing the required style properties
+
+        """
+        z = self.style_edge(fnode, tnode)
+        if count > 1:
+            z.setdefault("penwidth", "{:.3g}".format(1 + math.log2(count)))
+            z.setdefault("weight", str(count))
+        return z
+
+
+class HeatStyler(GraphvizStyler):
+    """Color nodes by one of their `~torchrecorder.nodes.BaseNode.stats`.
+
+    Nodes are filled from white (a ``heat_key`` of 0) to red (a ``heat_key`` of
+    ``heat_max`` or more); nodes without ``heat_key`` keep the default style.
+
+    Attributes:
+        heat_key (str):     name of the stat used for coloring
+        heat_max (float):   value of ``heat_key`` that gets the hottest color;
+                            if `None`, the `~torchrecorder.stats.stat_max` of
+                            the recording being rendered
+        stat_keys (list):   names of stats appended to each label
+    """
+
+    def __init__(
+        self, heat_key="time_excl", heat_max=None, stat_keys=(), **styler_args
+    ):
+        GraphvizStyler.__init__(self, **styler_args)
+        self.heat_key = heat_key
+        self.heat_max = heat_max
+        self.stat_keys = list(stat_keys)
+
+    def prepare(self, rec):
+        """Take `.heat_max` from ``rec`` if it was not given."""
+        if self.heat_max is None:
+            self.heat_max = stat_max(rec, self.heat_key)
+
+    def style_node(self, node):
+        """Construct style properties for the given node, colored by ``heat_key``.
+
+        Args:
+            node (`~torchrecorder.nodes.BaseNode`\ ):
+        Returns:
+            a `dict` containing the required style properties
+
+        """
+        z = GraphvizStyler.style_node(self, node)
+        value = node.stats.get(self.heat_key)
+        if value is not None and self.heat_max:
+            heat = min(max(value / self.heat_max, 0.0), 1.0)
+            z["fillcolor"] = "0.000 {:.3f} 1.000".format(heat)
+        for k in self.stat_keys:
+            if k in node.stats:
+                z["label"] += "\n{}={:.4g}".format(k, node.stats[k])
+        return z
+
 
 class GraphvizRenderer(BaseRenderer):
     """Render information from a `~torchrecorder.recorder.Recorder` into a `graphviz.Digraph`.
@@ -76,11 +161,20 @@ class GraphvizRenderer(BaseRenderer):
         styler (`class`): `.GraphvizStyler` or a subclass
     """
 
-    def __init__(self, rec, render_depth=256, styler_cls=None, **styler_args):
-        BaseRenderer.__init__(self, rec, render_depth)
+    def __init__(
+        self,
+        rec,
+        render_depth=256,
+        styler_cls=None,
+        expand=None,
+        edge_counts=False,
+        **styler_args
+    ):
+        BaseRenderer.__init__(self, rec, render_depth, expand, edge_counts)
         if styler_cls is None:
             styler_cls = GraphvizStyler
         self.styler = styler_cls(**styler_args)
+        self.styler.prepare(rec)
         self.recursion_trace = []
 
     def render_node(self, g, node):
@@ -89,7 +183,7 @@ class GraphvizRenderer(BaseRenderer):
         Renders ``node`` into the `~graphviz.Digraph` ``g``,
         after applying appropriate styling.
         If ``node`` is a `~torchrecorder.nodes.LayerNode`, checks
-        `.render_depth` to see if its
+        `.is_open` to see if its
         `~.torchrecorder.nodes.LayerNode.subnets` have to rendered.
 
         Args:
@@ -97,7 +191,7 @@ class GraphvizRenderer(BaseRenderer):
             node (`~torchrecorder.nodes.BaseNode`):
 
         """
-        if isinstance(node, LayerNode) and node.depth < self.render_depth:
+        if isinstance(node, LayerNode) and self.is_open(node):
             self.recursion_trace.append(g)
             self.render_recursive_node(g, node)
             self.recursion_trace.remove(g)
@@ -132,8 +226,10 @@ class GraphvizRenderer(BaseRenderer):
             for tnode in self.processed[fnode]:
                 if fnode.depth == tnode.depth:
                     self.render_edge(subg, fnode, tnode)
+                elif fnode.depth < tnode.depth:
+                    self.render_edge(g, fnode, tnode)
                 else:
-                    depth_diff = abs(fnode.depth - tnode.depth)
+                    depth_diff = fnode.depth - tnode.depth
                     self.render_edge(self.recursion_trace[-depth_diff], fnode, tnode)
             self.processed.pop(fnode)
         g.subgraph(subg)
@@ -147,5 +243,9 @@ class GraphvizRenderer(BaseRenderer):
             tnode (`~torchrecorder.nodes.BaseNode`):
 
         """
-        style = self.styler.style_edge(fnode, tnode)
+        if self.edge_counts:
+            count = self.counts[(fnode, tnode)]
+            style = self.styler.style_weighted_edge(fnode, tnode, count)
+        else:
+            style = self.styler.style_edge(fnode, tnode)
         g.edge(str(id(fnode)), str(id(tnode)), **style)
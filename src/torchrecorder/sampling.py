@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+    torchrecorder.sampling
+    ~~~~~~~~~~~~~~~~~
+
+    Sample per-module statistics from a network that keeps running
+
+    :copyright: (c) 2020 by Gautham Venkatasubramanian.
+    :license: see LICENSE for more details.
+"""
+from collections import OrderedDict
+from functools import partial
+from torch import Tensor
+import time
+from .nodes import LayerNode
+from .recorder import FrameTimer
+
+
+class Sampler(object):
+    """Gather statistics from every ``every``\ th call of a `torch.nn.Module`\ .
+
+    Unlike `~torchrecorder.recorder.Recorder`\ , a `Sampler` stays attached
+    to the network, and records no graph. Only ``net`` itself is hooked
+    between samples, and its hooks just count the call, so the other passes
+    run as they would without the `Sampler`\ . For a sampled pass, every
+    submodule is hooked for the duration of the pass, and the following are
+    accumulated into lists preallocated in the order of
+    `torch.nn.Module.named_modules`:
+
+    * ``calls``: number of calls
+    * ``time_incl``: nanoseconds spent in ``forward``, excluding the hooks
+    * ``time_excl``: ``time_incl`` minus that of the submodules
+    * ``time_max``: slowest single call, in nanoseconds
+    * ``shapes``: the number of calls seen with each `tuple` of input shapes,
+      up to ``max_shapes`` distinct ones; the rest are counted under `None`
+
+    A `Sampler` is not thread-safe: ``net`` must not be run concurrently.
+
+    Attributes:
+        every (int):        sampling period, in calls of ``net``
+        passes (int):       calls of ``net`` seen so far
+        samples (int):      calls of ``net`` sampled so far
+        qualnames (list(str)): qualified names of the submodules, ``""``
+                            being ``net`` itself
+    """
+
+    def __init__(self, net, every=100, max_shapes=8):
+        self.every = every
+        self.max_shapes = max_shapes
+        self.passes = 0
+        self.samples = 0
+        named = list(net.named_modules())
+        self.qualnames = [q for q, _ in named]
+        self.typenames = [type(x).__name__ for _, x in named]
+        self._modules = [x for _, x in named]
+        n = len(named)
+        self.calls = [0] * n
+        self.time_incl = [0] * n
+        self.time_excl = [0] * n
+        self.time_max = [0] * n
+        self.shapes = [dict() for _ in range(n)]
+
+        self._timer = FrameTimer()
+        self._handles = []
+        self._sampling = False
+        self._root = [
+            net.register_forward_pre_hook(partial(_root_prehook, sampler=self)),
+            net.register_forward_hook(partial(_root_posthook, sampler=self)),
+        ]
+
+    def remove(self):
+        """Detach the `Sampler` from the network; the statistics are kept."""
+        self._detach()
+        for h in self._root:
+            h.remove()
+        self._root = []
+
+    def reset(self):
+        """Zero the statistics, without reallocating them."""
+        self.passes = 0
+        self.samples = 0
+        for i in range(len(self.qualnames)):
+            self.calls[i] = 0
+            self.time_incl[i] = 0
+            self.time_excl[i] = 0
+            self.time_max[i] = 0
+            self.shapes[i].clear()
+
+    def table(self):
+        """Summarize the statistics of each submodule.
+
+        Returns:
+            a `list` of `dict`\ s, one per submodule called in a sampled pass,
+            with its ``qualname`` and ``type``\ , the mean ``calls``\ ,
+            ``time_incl`` and ``time_excl`` per sampled pass, the
+            ``time_max`` and the ``shapes`` seen
+
+        """
+        rows = []
+        samples = max(self.samples, 1)
+        for i, q in enumerate(self.qualnames):
+            if self.calls[i] == 0:
+                continue
+            row = OrderedDict(qualname=q, type=self.typenames[i])
+            row["calls"] = self.calls[i] / samples
+            row["time_incl"] = self.time_incl[i] / samples
+            row["time_excl"] = self.time_excl[i] / samples
+            row["time_max"] = self.time_max[i]
+            row["shapes"] = dict(self.shapes[i])
+            rows.append(row)
+        return rows
+
+    def annotate(self, rec):
+        """Store the statistics in the `~torchrecorder.nodes.LayerNode`\ s of ``rec``\ .
+
+        The ``calls``\ , ``time_incl`` and ``time_excl`` are stored as means
+        per sampled pass, like those of `~.Recorder.profile_passes`\ , so a
+        recording of the same network can be rendered with a
+        `~torchrecorder.renderer.HeatStyler` or tabulated with
+        `~torchrecorder.stats.stat_table`\ . Nodes are matched by ``qualname``\ .
+
+        Args:
+            rec (`~torchrecorder.recorder.Recorder`):
+
+        Returns:
+            `None`
+
+        """
+        rows = dict((row["qualname"], row) for row in self.table())
+        for x in rec.nodes.values():
+            if isinstance(x, LayerNode) and x.qualname in rows:
+                row = rows[x.qualname]
+                for k in ("calls", "time_incl", "time_excl", "time_max"):
+                    x.stats[k] = row[k]
+
+    def _attach(self):
+        for i in range(1, len(self._modules)):
+            x = self._modules[i]
+            pre = partial(_prehook, sampler=self, index=i)
+            post = partial(_posthook, sampler=self, index=i)
+            self._handles.append(x.register_forward_pre_hook(pre))
+            self._handles.append(x.register_forward_hook(post))
+
+    def _detach(self):
+        for h in self._handles:
+            h.remove()
+        del self._handles[:]
+        self._timer.clear()
+        self._sampling = False
+
+
+def _root_prehook(module, inputs, sampler):
+    """Count a call of the sampled network, and start sampling every ``every``\ th one."""
+    if sampler._sampling:  # the last sampled pass raised an exception
+        sampler._detach()
+    sampler.passes += 1
+    if sampler.passes % sampler.every != 0:
+        return
+    sampler._sampling = True
+    sampler.samples += 1
+    sampler._attach()
+    _prehook(module, inputs, sampler, 0)
+
+
+def _root_posthook(module, inputs, outputs, sampler):
+    """Finish a sampled pass of the network."""
+    if sampler._sampling and len(sampler._timer.frames) == 1:
+        _posthook(module, inputs, outputs, sampler, 0)
+        sampler._detach()
+
+
+def _prehook(module, inputs, sampler, index):
+    """Start timing the submodule at ``index`` and note the shapes of ``inputs``."""
+    start = time.perf_counter_ns()
+    shapes = sampler.shapes[index]
+    key = tuple(tuple(x.shape) for x in inputs if isinstance(x, Tensor))
+    if key in shapes or len(shapes) < sampler.max_shapes:
+        shapes[key] = shapes.get(key, 0) + 1
+    else:
+        shapes[None] = shapes.get(None, 0) + 1
+    sampler._timer.enter(start)
+
+
+def _posthook(module, inputs, outputs, sampler, index):
+    """Stop timing the submodule at ``index``\ ."""
+    end = time.perf_counter_ns()
+    incl, excl = sampler._timer.exit(end)
+    sampler.calls[index] += 1
+    sampler.time_incl[index] += incl
+    sampler.time_excl[index] += excl
+    if incl > sampler.time_max[index]:
+        sampler.time_max[index] = incl
+    sampler._timer.done(end)
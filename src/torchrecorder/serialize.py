@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+"""
+    torchrecorder.serialize
+    ~~~~~~~~~~~~~~~~~~
+
+    Save and load recordings without re-running the network
+
+    :copyright: (c) 2020 by Gautham Venkatasubramanian.
+    :license: see LICENSE for more details.
+"""
+import json
+import struct
+import sys
+import zlib
+from array import array
+from .nodes import LayerNode, FnSummary
+from .recorder import Recorder
+from .store import KINDS, NodeStore, EdgeStore
+
+FORMAT_VERSION = 1
+MAGIC = b"TRCREC"
+
+
+def node_table(rec):
+    """Flatten the nodes and edges of a `~.Recorder` into plain rows.
+
+    Nodes are numbered by `~.Recorder.stable_ids`; the context node is left
+    out, and a ``parent`` of ``-1`` refers to it. ``subnet`` is `False` for the
+    few nodes that are not listed in the ``subnets`` of their parent. The
+    ``signature`` and ``boundary`` of each `~.nodes.LayerNode` are kept, so a
+    loaded recording can be passed as ``previous`` to `~torchrecorder.record`\ .
+
+    Args:
+        rec (`~.Recorder`):
+
+    Returns:
+        a `tuple` of a `list` of node `dict`\ s and a `list` of
+        ``(from, to, timestamp)`` edges
+
+    """
+    ids = rec.stable_ids()
+    subnets = set()
+    for node in rec.nodes.values():
+        if isinstance(node, LayerNode):
+            subnets.update(ids[s] for s in node.subnets)
+    nodes = []
+    seen = set()
+    for fn, node in rec.nodes.items():
+        key = ids[fn]
+        if key is None or key in seen:
+            continue
+        seen.add(key)
+        info = node.fn if isinstance(node.fn, FnSummary) else FnSummary.of(node.fn)
+        parent = ids[node.parent]
+        boundary = [
+            [None if xs is None else [ids[x] for x in xs] for xs in b]
+            for b in getattr(node, "boundary", [])
+        ]
+        nodes.append(
+            dict(
+                kind=type(node).__name__,
+                name=node.name,
+                depth=node.depth,
+                parent=-1 if parent is None else parent,
+                subnet=key in subnets,
+                typename=info.typename,
+                shape=None if info.shape is None else list(info.shape),
+                dtype=info.dtype,
+                device=info.device,
+                qualname=getattr(node, "qualname", None),
+                opaque=bool(getattr(node, "opaque", False)),
+                signature=getattr(node, "signature", None),
+                boundary=boundary,
+                stats=dict(node.stats),
+            )
+        )
+    edges = sorted((ids[x], ids[y], z) for x, y, z in rec.edges)
+    return nodes, edges
+
+
+def from_table(nodes, edges):
+    """Construct a compact `~.Recorder` from the rows made by `node_table`.
+
+    The ``fn`` of every node is a `~.nodes.FnSummary`, so the result can be
+    rendered as usual, but has no `torch.nn.Module`\ s to inspect.
+
+    Args:
+        nodes (list(dict)):
+        edges (list(tuple)):
+
+    Returns:
+        a `~.Recorder`
+
+    """
+    kinds = dict((cls.__name__, cls) for cls in KINDS)
+    rec = Recorder()
+    for i, row in enumerate(nodes):
+        shape = row["shape"]
+        info = FnSummary(
+            typename=row["typename"],
+            shape=None if shape is None else tuple(shape),
+            dtype=row["dtype"],
+            device=row["device"],
+        )
+        parent = None if row["parent"] < 0 else row["parent"]
+        x = kinds[row["kind"]](
+            name=row["name"], fn=info, depth=row["depth"], parent=parent
+        )
+        x.stats.update(row["stats"])
+        if isinstance(x, LayerNode):
+            x.qualname = row["qualname"]
+            x.opaque = row["opaque"]
+            x.signature = row["signature"]
+            x.boundary = row["boundary"]
+        rec.nodes[i] = x
+        rec.fn_set.add(i)
+    for i, row in enumerate(nodes):
+        if row["parent"] >= 0 and row["subnet"]:
+            rec.nodes[row["parent"]].subnets.add(i)
+    rec.edges = set((x, y, z) for x, y, z in edges)
+    return rec
+
+
+def dump_json(rec, f):
+    """Write a `~.Recorder` to the text file-like object ``f`` as JSON."""
+    nodes, edges = node_table(rec)
+    data = dict(
+        format="torchrecorder", version=FORMAT_VERSION, nodes=nodes, edges=edges
+    )
+    json.dump(data, f)
+
+
+def load_json(f):
+    """Read a `~.Recorder` written by `dump_json` from ``f``."""
+    data = json.load(f)
+    if data.get("format") != "torchrecorder":
+        raise ValueError("Not a torchrecorder recording")
+    if data["version"] != FORMAT_VERSION:
+        raise ValueError("Unsupported recording version " + str(data["version"]))
+    return from_table(data["nodes"], data["edges"])
+
+
+def dump_binary(rec, f):
+    """Write a `~.Recorder` to the binary file-like object ``f``.
+
+    Every column of the node and edge tables is stored as a little-endian
+    `array.array`; names, type names, dtypes, devices, qualnames and signatures are
+    interned in a single string table, and the ``opaque`` flags are stored as bytes.
+    The non-empty ``stats`` and ``boundary`` lists of the nodes follow as JSON, and
+    a CRC32 of everything before it ends the file.
+    """
+    nodes, edges = node_table(rec)
+    strings = []
+    interned = dict()
+
+    def intern(s):
+        if s is None:
+            return -1
+        if s not in interned:
+            interned[s] = len(strings)
+            strings.append(s)
+        return interned[s]
+
+    kinds = dict((cls.__name__, i) for i, cls in enumerate(KINDS))
+    columns = [
+        array("b", [kinds[n["kind"]] for n in nodes]),
+        array("i", [n["depth"] for n in nodes]),
+        array("i", [n["parent"] for n in nodes]),
+        array("b", [n["subnet"] for n in nodes]),
+        array("i", [intern(n["name"]) for n in nodes]),
+        array("i", [intern(n["typename"]) for n in nodes]),
+        array("i", [intern(n["dtype"]) for n in nodes]),
+        array("i", [intern(n["device"]) for n in nodes]),
+        array("b", [-1 if n["shape"] is None else len(n["shape"]) for n in nodes]),
+        array("q", [d for n in nodes if n["shape"] is not None for d in n["shape"]]),
+        array("i", [intern(n["qualname"]) for n in nodes]),
+        array("b", [n["opaque"] for n in nodes]),
+        array("i", [intern(n["signature"]) for n in nodes]),
+        array("i", [e[0] for e in edges]),
+        array("i", [e[1] for e in edges]),
+        array("d", [e[2] for e in edges]),
+    ]
+
+    crc = 0
+
+    def write(b):
+        nonlocal crc
+        crc = zlib.crc32(b, crc)
+        f.write(b)
+
+    write(MAGIC + struct.pack("<B", FORMAT_VERSION))
+    write(struct.pack("<I", len(strings)))
+    for s in strings:
+        b = s.encode("utf-8")
+        write(struct.pack("<I", len(b)) + b)
+    for col in columns:
+        if sys.byteorder == "big":
+            col = array(col.typecode, col)
+            col.byteswap()
+        write(struct.pack("<cQ", col.typecode.encode("ascii"), len(col)))
+        write(col.tobytes())
+    stats = dict((i, n["stats"]) for i, n in enumerate(nodes) if n["stats"])
+    boundary = dict((i, n["boundary"]) for i, n in enumerate(nodes) if n["boundary"])
+    for blob in (stats, boundary):
+        b = json.dumps(blob).encode("utf-8")
+        write(struct.pack("<Q", len(b)) + b)
+    f.write(struct.pack("<I", crc))
+
+
+def load_binary(f, columnar=False):
+    """Read a `~.Recorder` written by `dump_binary` from ``f``.
+
+    If ``columnar`` is `True`, the columns are loaded straight into a
+    `~.store.NodeStore` and an `~.store.EdgeStore` (see `~.Recorder.compact`),
+    without constructing a `~.nodes.BaseNode` per node.
+
+    Raises:
+        `ValueError`: if ``f`` is not a recording, fails its checksum, or
+        has a length or index out of range
+    """
+    data = f.read()
+    if data[: len(MAGIC)] != MAGIC:
+        raise ValueError("Not a torchrecorder recording")
+    if len(data) < len(MAGIC) + 5:
+        raise ValueError("Truncated recording")
+    (crc,) = struct.unpack("<I", data[-4:])
+    data = memoryview(data)[:-4]
+    if zlib.crc32(data) != crc:
+        raise ValueError("Corrupt recording: checksum mismatch")
+    reader = _Reader(data, len(MAGIC))
+    (version,) = reader.unpack("<B")
+    if version != FORMAT_VERSION:
+        raise ValueError("Unsupported recording version " + str(version))
+    (n_strings,) = reader.unpack("<I")
+    strings = []
+    for _ in range(n_strings):
+        (size,) = reader.unpack("<I")
+        strings.append(str(reader.take(size), "utf-8"))
+
+    node_cols = [reader.array(t) for t in "biibiiiib"]
+    kind, depth, parent, subnet, name, typename, dtype, device, ndim = node_cols
+    dims = reader.array("q")
+    qualname, opaque, signature = [reader.array(t) for t in "ibi"]
+    src, dst, ts = [reader.array(t) for t in "iid"]
+    stats = reader.json()
+    boundary = reader.json()
+    if reader.offset != len(data):
+        raise ValueError("Corrupt recording: trailing data")
+    _check(strings, node_cols + [qualname, opaque, signature], dims, src, dst, ts)
+    _check_blobs(len(kind), stats, boundary)
+
+    if columnar:
+        store = NodeStore()
+        store.kind, store.depth, store.parent, store.subnet = kind, depth, parent, subnet
+        store.name, store.typename, store.dtype, store.device = name, typename, dtype, device
+        store.qualname = qualname
+        store.strings = strings
+        store._interned = dict((s, i) for i, s in enumerate(strings))
+        offset = 0
+        for n in ndim:
+            shape = None if n < 0 else dims[offset : offset + n]
+            store.shape.append(store.intern_shape(shape))
+            offset += max(n, 0)
+        store.stats = dict((int(i), s) for i, s in stats.items())
+        for i, o in enumerate(opaque):
+            if o:
+                store.extra.setdefault(i, dict())["opaque"] = True
+        for i, s in enumerate(signature):
+            if s >= 0:
+                store.extra.setdefault(i, dict())["signature"] = strings[s]
+        for i, b in boundary.items():
+            store.extra.setdefault(int(i), dict())["boundary"] = b
+        rec = Recorder()
+        rec.nodes = rec.fn_set = store
+        rec.edges = EdgeStore()
+        rec.edges.src, rec.edges.dst, rec.edges.ts = src, dst, ts
+        return rec
+
+    def lookup(i):
+        return None if i < 0 else strings[i]
+
+    nodes = []
+    offset = 0
+    for i in range(len(kind)):
+        shape = None
+        if ndim[i] >= 0:
+            shape = list(dims[offset : offset + ndim[i]])
+            offset += ndim[i]
+        nodes.append(
+            dict(
+                kind=KINDS[kind[i]].__name__,
+                name=lookup(name[i]),
+                depth=depth[i],
+                parent=parent[i],
+                subnet=bool(subnet[i]),
+                typename=lookup(typename[i]),
+                shape=shape,
+                dtype=lookup(dtype[i]),
+                device=lookup(device[i]),
+                qualname=lookup(qualname[i]),
+                opaque=bool(opaque[i]),
+                signature=lookup(signature[i]),
+                boundary=boundary.get(str(i), []),
+                stats=stats.get(str(i), {}),
+            )
+        )
+    return from_table(nodes, zip(src, dst, ts))
+
+
+class _Reader(object):
+    """Read the sections of a recording from ``data``\ , checking every length."""
+
+    def __init__(self, data, offset):
+        self.data = data
+        self.offset = offset
+
+    def take(self, size):
+        end = self.offset + size
+        if size < 0 or end > len(self.data):
+            raise ValueError("Corrupt recording: length out of range")
+        b = self.data[self.offset : end]
+        self.offset = end
+        return b
+
+    def unpack(self, fmt):
+        return struct.unpack(fmt, self.take(struct.calcsize(fmt)))
+
+    def array(self, typecode):
+        code, size = self.unpack("<cQ")
+        if code != typecode.encode("ascii"):
+            raise ValueError("Corrupt recording: unexpected column type")
+        col = array(typecode)
+        if size > (len(self.data) - self.offset) // col.itemsize:
+            raise ValueError("Corrupt recording: length out of range")
+        col.frombytes(self.take(size * col.itemsize))
+        if sys.byteorder == "big":
+            col.byteswap()
+        return col
+
+    def json(self):
+        (size,) = self.unpack("<Q")
+        blob = json.loads(str(self.take(size), "utf-8"))
+        if not isinstance(blob, dict):
+            raise ValueError("Corrupt recording: expected a JSON object")
+        return blob
+
+
+def _check(strings, node_cols, dims, src, dst, ts):
+    """Raise `ValueError` unless the columns of `load_binary` are consistent."""
+    kind, depth, parent, subnet, name, typename, dtype, device, ndim = node_cols[:9]
+    n = len(kind)
+    if any(len(col) != n for col in node_cols) or not len(src) == len(dst) == len(ts):
+        raise ValueError("Corrupt recording: columns of different lengths")
+    if n != 0 and (min(kind) < 0 or max(kind) >= len(KINDS)):
+        raise ValueError("Corrupt recording: node kind out of range")
+    if n != 0 and (min(parent) < -1 or max(parent) >= n):
+        raise ValueError("Corrupt recording: parent out of range")
+    layer = KINDS.index(LayerNode)
+    if any(p >= 0 and kind[p] != layer for p in parent):
+        raise ValueError("Corrupt recording: parent is not a layer")
+    if any(d != (depth[p] + 1 if p >= 0 else 0) for d, p in zip(depth, parent)):
+        raise ValueError("Corrupt recording: depth does not match its parent")
+    if n != 0 and min(ndim) < -1:
+        raise ValueError("Corrupt recording: shape out of range")
+    if sum(max(d, 0) for d in ndim) != len(dims):
+        raise ValueError("Corrupt recording: shapes do not match their dims")
+    qualname, opaque, signature = node_cols[9:]
+    for col in (name, typename, dtype, device, qualname, signature):
+        if n != 0 and (min(col) < -1 or max(col) >= len(strings)):
+            raise ValueError("Corrupt recording: string index out of range")
+    for col in (src, dst):
+        if len(col) != 0 and (min(col) < 0 or max(col) >= n):
+            raise ValueError("Corrupt recording: edge out of range")
+
+
+def _check_blobs(n, stats, boundary):
+    """Raise `ValueError` unless the JSON blobs of `load_binary` fit ``n`` nodes."""
+
+    def index(k):
+        if not k.isdigit() or int(k) >= n:
+            raise ValueError("Corrupt recording: node index out of range")
+
+    for k, v in stats.items():
+        index(k)
+        if not isinstance(v, dict):
+            raise ValueError("Corrupt recording: stats are not a JSON object")
+    for k, calls in boundary.items():
+        index(k)
+        if not isinstance(calls, list):
+            raise ValueError("Corrupt recording: boundary is not a list")
+        for call in calls:
+            if not isinstance(call, list) or len(call) != 2:
+                raise ValueError("Corrupt recording: boundary is not a list")
+            for xs in call:
+                if xs is None:
+                    continue
+                if not isinstance(xs, list) or not all(
+                    isinstance(x, int) and 0 <= x < n for x in xs
+                ):
+                    raise ValueError("Corrupt recording: boundary out of range")
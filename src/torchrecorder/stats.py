@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+    torchrecorder.stats
+    ~~~~~~~~~~~~~~
+
+    Tabulate the measurements stored in recorded nodes
+
+    :copyright: (c) 2020 by Gautham Venkatasubramanian.
+    :license: see LICENSE for more details.
+"""
+import csv
+from .nodes import LayerNode
+
+
+def stat_table(rec, keys=None, kinds=(LayerNode,)):
+    """Collect the `~torchrecorder.nodes.BaseNode.stats` of recorded nodes.
+
+    Args:
+        rec (`~torchrecorder.recorder.Recorder`):
+        keys (list(str), optional): stats to include, defaults to all the
+                                    stats found in the selected nodes
+        kinds (tuple):              `~torchrecorder.nodes.BaseNode` subclasses to include
+
+    Returns:
+        a `list` of `dict`\ s, one per node in recording order, with the
+        ``name``, ``type`` and ``depth`` of the node followed by ``keys``
+
+    """
+    nodes = []
+    seen = set()
+    for node in rec.nodes.values():
+        if isinstance(node, kinds) and node not in seen:
+            seen.add(node)
+            nodes.append(node)
+    if keys is None:
+        keys = []
+        for node in nodes:
+            keys.extend(k for k in node.stats if k not in keys)
+    rows = []
+    for node in nodes:
+        row = dict(
+            name=node.name.split("\n")[0],
+            type=getattr(node.fn, "typename", type(node.fn).__name__),
+            depth=node.depth,
+        )
+        for k in keys:
+            row[k] = node.stats.get(k)
+        rows.append(row)
+    return rows
+
+
+def write_table(rec, f, keys=None, kinds=(LayerNode,)):
+    """Write the `stat_table` of ``rec`` as CSV into the text file-like object ``f``."""
+    rows = stat_table(rec, keys, kinds)
+    fields = ["name", "type", "depth"]
+    for row in rows:
+        fields.extend(k for k in row if k not in fields)
+    writer = csv.DictWriter(f, fieldnames=fields)
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def stat_max(rec, key):
+    """Largest value of the stat ``key`` among the recorded nodes, or `None`.
+
+    Useful as the ``heat_max`` of a `~torchrecorder.renderer.HeatStyler`\ .
+    """
+    values = [x.stats[key] for x in rec.nodes.values() if key in x.stats]
+    return max(values) if len(values) != 0 else None
+
+
+def rollup(rec, key, total_key=None):
+    """Sum a stat over the hierarchy of `~torchrecorder.nodes.LayerNode`\ s.
+
+    The total for each `~torchrecorder.nodes.LayerNode` is its own ``key``,
+    plus the totals of the `~torchrecorder.nodes.LayerNode`\ s and the ``key``
+    of the other nodes in its ``subnets``. The total for any other node with a
+    ``key`` is the ``key`` itself, so that ``total_key`` can be used to color all
+    the nodes with a `~torchrecorder.renderer.HeatStyler`\ .
+
+    Args:
+        rec (`~torchrecorder.recorder.Recorder`):
+        key (str):          stat to be summed
+        total_key (str, optional): stat in which the total is stored,
+                            defaults to ``key + "_total"``
+
+    Returns:
+        `None`
+
+    """
+    if total_key is None:
+        total_key = key + "_total"
+    layers = set(x for x in rec.nodes.values() if isinstance(x, LayerNode))
+    for x in sorted(layers, key=lambda x: x.depth, reverse=True):
+        total = x.stats.get(key, 0)
+        for s in x.subnets:
+            y = rec.nodes[s]
+            if isinstance(y, LayerNode):
+                total += y.stats.get(total_key, 0)
+            elif key in y.stats:
+                y.stats[total_key] = y.stats[key]
+                total += y.stats[key]
+        x.stats[total_key] = total
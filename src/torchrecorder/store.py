@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""
+    torchrecorder.store
+    ~~~~~~~~~~~~~~
+
+    Columnar storage for compact recordings
+
+    :copyright: (c) 2020 by Gautham Venkatasubramanian.
+    :license: see LICENSE for more details.
+"""
+from array import array
+from weakref import WeakKeyDictionary, WeakValueDictionary
+from .nodes import BaseNode, TensorNode, ParamNode, OpNode, LayerNode, FnSummary
+
+KINDS = (BaseNode, TensorNode, ParamNode, OpNode, LayerNode)
+
+
+def kind_of(node):
+    """Index in `KINDS` of the class of ``node``, which may be a subclass."""
+    for i in range(len(KINDS) - 1, -1, -1):
+        if isinstance(node, KINDS[i]):
+            return i
+    raise TypeError("Not a node: " + repr(node))
+
+
+class NodeStore(object):
+    """Store the nodes of a compact `~torchrecorder.recorder.Recorder` in columns.
+
+    Instead of one `~torchrecorder.nodes.BaseNode` per node, a `NodeStore`
+    keeps one `array.array` per attribute, indexed by the id of the node. Names,
+    type names, dtypes, devices and qualnames are interned in ``strings``, and
+    shapes in ``shapes``, so each node takes a few dozen bytes. Only the
+    `torch.nn.Module`\ s, the non-empty ``stats`` and the extra attributes of
+    `~torchrecorder.nodes.LayerNode`\ s are kept in `dict`\ s.
+
+    A `NodeStore` can be used in place of the ``nodes`` of a
+    `~torchrecorder.recorder.Recorder`\ : it maps `None` to the context node,
+    and the ids ``0`` to ``len(self) - 2`` to nodes of the usual
+    `~torchrecorder.nodes.BaseNode` subclasses, built from the columns when
+    they are looked up. The same node is returned for an id as long as it is
+    referenced. Changes to the ``stats`` of a node are kept in the store;
+    other changes are only kept once the node is assigned back to its id, as
+    in ``store[i] = node``\ . Nodes cannot be added or removed.
+
+    Attributes:
+        kind (`array.array`):       index of the class of each node in `KINDS`
+        depth (`array.array`):      ``depth`` of each node
+        parent (`array.array`):     ``parent`` of each node, ``-1`` for the context
+        subnet (`array.array`):     whether each node is in the ``subnets`` of its parent
+        name (`array.array`):       index of the ``name`` of each node in ``strings``
+        typename (`array.array`):   index of the type name of the ``fn``
+                                    of each node in ``strings``
+        dtype (`array.array`):      index of the dtype in ``strings``, or ``-1``
+        device (`array.array`):     index of the device in ``strings``, or ``-1``
+        shape (`array.array`):      index of the shape in ``shapes``, or ``-1``
+        qualname (`array.array`):   index of the ``qualname`` in ``strings``, or ``-1``
+        strings (list(str)):        interned strings
+        shapes (list(tuple)):       interned shapes
+        stats (dict):               maps ids to non-empty ``stats``
+        modules (dict):             maps ids to the `torch.nn.Module` ``fn``\ s
+                                    of `~torchrecorder.nodes.LayerNode`\ s
+        extra (dict):               maps ids to the other attributes of
+                                    `~torchrecorder.nodes.LayerNode`\ s, like
+                                    ``signature`` and ``boundary``, when they
+                                    are not `None`, `False` or empty
+        context (`~torchrecorder.nodes.BaseNode`): the context node
+    """
+
+    columns = (
+        ("kind", "b"),
+        ("depth", "i"),
+        ("parent", "i"),
+        ("subnet", "b"),
+        ("name", "i"),
+        ("typename", "i"),
+        ("dtype", "i"),
+        ("device", "i"),
+        ("shape", "i"),
+        ("qualname", "i"),
+    )
+
+    def __init__(self):
+        for col, typecode in self.columns:
+            setattr(self, col, array(typecode))
+        self.strings = []
+        self.shapes = []
+        self.stats = dict()
+        self.modules = dict()
+        self.extra = dict()
+        self.context = BaseNode(fn=None, depth=-1, parent=None, name="ContextDummy")
+        self._interned = dict()
+        self._shape_ids = dict()
+        self._children = None
+        self._nodes = WeakValueDictionary()
+        self._keys = WeakKeyDictionary()
+
+    @classmethod
+    def from_nodes(cls, nodes):
+        """Store the ``nodes`` of a compact `~torchrecorder.recorder.Recorder`\ .
+
+        Args:
+            nodes (dict): maps `None` to the context, and ``0``, ``1``, ...
+                          to `~torchrecorder.nodes.BaseNode`\ s, in that order
+
+        Returns:
+            a `NodeStore`
+        """
+        store = cls()
+        subnets = set()
+        for node in nodes.values():
+            if isinstance(node, LayerNode):
+                subnets.update(node.subnets)
+        for i, (k, node) in enumerate(x for x in nodes.items() if x[0] is not None):
+            if k != i:
+                raise ValueError("Nodes must be numbered in order, see Recorder.compact")
+            store.append(node, subnet=k in subnets)
+        return store
+
+    def append(self, node, subnet=True):
+        """Store a copy of ``node`` under the next id.
+
+        Args:
+            node (`~torchrecorder.nodes.BaseNode`): a node whose ``parent``
+                        is an id in the store, or `None`
+            subnet (bool): whether ``node`` is in the ``subnets`` of its parent
+
+        Returns:
+            the id of the stored node
+        """
+        i = len(self.kind)
+        for col, _ in self.columns:
+            getattr(self, col).append(-1)
+        self.subnet[i] = subnet
+        self._write(i, node)
+        return i
+
+    def _write(self, i, node):
+        """Store a copy of ``node`` under the existing id ``i``\ ."""
+        self.kind[i] = kind_of(node)
+        self.depth[i] = node.depth
+        self.parent[i] = -1 if node.parent is None else node.parent
+        self.name[i] = self.intern(node.name)
+        self.qualname[i] = -1
+        self.set_fn(i, node.fn)
+        self.extra.pop(i, None)
+        self.stats.pop(i, None)
+        self._children = None
+        if isinstance(node, LayerNode):
+            self.qualname[i] = self.intern(node.qualname)
+            extra = dict()
+            for attr in _EXTRA:
+                value = getattr(node, attr)
+                if value is not None and value is not False and value != []:
+                    extra[attr] = value
+            if len(extra) != 0:
+                self.extra[i] = extra
+        if len(node.stats) != 0:
+            self.stats[i] = dict(node.stats)
+
+    def _node(self, i):
+        """A new node with the attributes stored under ``i``\ ."""
+        cls = KINDS[self.kind[i]]
+        p = self.parent[i]
+        node = cls(
+            name=self.lookup(self.name[i]),
+            fn=self.get_fn(i),
+            depth=self.depth[i],
+            parent=None if p < 0 else p,
+        )
+        stats = self.stats.get(i)
+        node.stats = _Stats(self, i) if stats is None else stats
+        if cls is LayerNode:
+            node.subnets = set(c for c in self.children(i) if self.subnet[c])
+            node.qualname = self.lookup(self.qualname[i])
+            for attr, value in self.extra.get(i, dict()).items():
+                setattr(node, attr, value)
+        return node
+
+    def intern(self, s):
+        """Index of the `str` ``s`` in ``strings``, adding it if necessary; ``-1`` for `None`."""
+        if s is None:
+            return -1
+        i = self._interned.get(s)
+        if i is None:
+            i = self._interned[s] = len(self.strings)
+            self.strings.append(s)
+        return i
+
+    def intern_shape(self, shape):
+        """Index of ``shape`` in ``shapes``, adding it if necessary; ``-1`` for `None`."""
+        if shape is None:
+            return -1
+        shape = tuple(shape)
+        i = self._shape_ids.get(shape)
+        if i is None:
+            i = self._shape_ids[shape] = len(self.shapes)
+            self.shapes.append(shape)
+        return i
+
+    def lookup(self, i):
+        """The interned `str` at ``i``, or `None` for ``-1``."""
+        return None if i < 0 else self.strings[i]
+
+    def get_fn(self, i):
+        """The ``fn`` of node ``i``: its `torch.nn.Module`, if stored, else a `~torchrecorder.nodes.FnSummary`\ ."""
+        module = self.modules.get(i)
+        if module is not None:
+            return module
+        if self.typename[i] < 0:
+            return None
+        shape = self.shape[i]
+        return FnSummary(
+            typename=self.strings[self.typename[i]],
+            shape=None if shape < 0 else self.shapes[shape],
+            dtype=self.lookup(self.dtype[i]),
+            device=self.lookup(self.device[i]),
+        )
+
+    def set_fn(self, i, fn):
+        """Store ``fn``, which is summarized unless it is a `torch.nn.Module`\ ."""
+        self.modules.pop(i, None)
+        if fn is None:
+            self.typename[i] = -1
+            return
+        if KINDS[self.kind[i]] is LayerNode and not isinstance(fn, FnSummary):
+            self.modules[i] = fn
+        info = fn if isinstance(fn, FnSummary) else FnSummary.of(fn)
+        self.typename[i] = self.intern(info.typename)
+        self.dtype[i] = self.intern(info.dtype)
+        self.device[i] = self.intern(info.device)
+        self.shape[i] = self.intern_shape(info.shape)
+
+    def children(self, i):
+        """Ids of the nodes whose ``parent`` is ``i``\ , in order.
+
+        The index is built on first use, and rebuilt after ``parent`` changes.
+        """
+        if self._children is None:
+            n = len(self.kind)
+            offsets = array("i", [0] * (n + 2))
+            for p in self.parent:
+                offsets[p + 2] += 1
+            for j in range(2, n + 2):
+                offsets[j] += offsets[j - 1]
+            order = array("i", [0] * n)
+            for j, p in enumerate(self.parent):
+                order[offsets[p + 1]] = j
+                offsets[p + 1] += 1
+            self._children = (order, offsets)
+        order, offsets = self._children
+        return order[offsets[i] : offsets[i + 1]]
+
+    def key_of(self, node):
+        """The id of ``node``\ , a node from this store, or `None` for the context."""
+        return None if node is self.context else self._keys[node]
+
+    def __getitem__(self, key):
+        if key is None:
+            return self.context
+        node = self._nodes.get(key)
+        if node is None:
+            if key not in self:
+                raise KeyError(key)
+            node = self._node(key)
+            self._nodes[key] = node
+            self._keys[node] = key
+        return node
+
+    def __setitem__(self, key, node):
+        if key is None or key not in self:
+            raise KeyError(key)
+        self._write(key, node)
+        if isinstance(node, LayerNode):
+            for c in self.children(key):
+                self.subnet[c] = c in node.subnets
+        self._nodes.pop(key, None)
+
+    def __contains__(self, key):
+        return key is None or (isinstance(key, int) and 0 <= key < len(self.kind))
+
+    def __iter__(self):
+        yield None
+        for i in range(len(self.kind)):
+            yield i
+
+    def __len__(self):
+        return len(self.kind) + 1
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        for k in self:
+            yield self[k]
+
+    def items(self):
+        for k in self:
+            yield k, self[k]
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+
+class EdgeStore(object):
+    """Store the edges of a compact `~torchrecorder.recorder.Recorder` in columns.
+
+    Can be used in place of the ``edges`` of a
+    `~torchrecorder.recorder.Recorder`\ : iterating over it gives the usual
+    ``(from, to, timestamp)`` tuples. Unlike a `set`\ , `add` does not check
+    for duplicates.
+
+    Attributes:
+        src (`array.array`): ids of the sources of the edges
+        dst (`array.array`): ids of the destinations of the edges
+        ts (`array.array`):  timestamps of the edges
+    """
+
+    def __init__(self, edges=()):
+        self.src = array("i")
+        self.dst = array("i")
+        self.ts = array("d")
+        for edge in edges:
+            self.add(edge)
+
+    def add(self, edge):
+        """Append the ``(from, to, timestamp)`` tuple ``edge``\ ."""
+        x, y, z = edge
+        self.src.append(x)
+        self.dst.append(y)
+        self.ts.append(z)
+
+    def __iter__(self):
+        return zip(self.src, self.dst, self.ts)
+
+    def __len__(self):
+        return len(self.src)
+
+    def __contains__(self, edge):
+        return any(e == edge for e in self)
+
+
+_EXTRA = ("signature", "boundary", "opaque", "pre", "post", "back")
+
+
+class _Stats(dict):
+    """Empty ``stats`` of a stored node, added to the `NodeStore` when first set."""
+
+    __slots__ = ("_store", "_id")
+
+    def __init__(self, store, i):
+        dict.__init__(self)
+        self._store = store
+        self._id = i
+
+    def __setitem__(self, key, value):
+        self._store.stats.setdefault(self._id, self)
+        dict.__setitem__(self, key, value)
+
+    def update(self, *args, **kwargs):
+        self._store.stats.setdefault(self._id, self)
+        dict.update(self, *args, **kwargs)
+
+    def setdefault(self, key, default=None):
+        self._store.stats.setdefault(self._id, self)
+        return dict.setdefault(self, key, default)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+    torchrecorder.trace
+    ~~~~~~~~~~~~~~
+
+    Export the timeline of a recorded pass as a Chrome trace
+
+    :copyright: (c) 2020 by Gautham Venkatasubramanian.
+    :license: see LICENSE for more details.
+"""
+import json
+from .nodes import LayerNode, FnSummary
+
+
+def trace_events(rec, pid=0, tid=0):
+    """Generate the Chrome trace events for the `~.Recorder.events` of ``rec``\ .
+
+    Each event is a complete (``"X"``) event, with its ``ts`` and ``dur`` in
+    microseconds. Since the calls of a module start before and end after
+    those of its submodules and ops, trace viewers stack the events by module
+    nesting. Events of `~torchrecorder.nodes.LayerNode`\ s have the category
+    ``"module"`` and their ``qualname`` in ``args``\ ; the others have the
+    category ``"op"``\ .
+
+    Args:
+        rec (`~torchrecorder.recorder.Recorder`):
+        pid (int, optional): process id of the events. Default ``0``.
+        tid (int, optional): thread id of the events. Default ``0``.
+
+    Returns:
+        an iterator over `dict`\ s, one per event, in recording order
+
+    """
+    # only modules are memoized: there may be as many ops as events
+    layers = dict()
+    for fn, begin, end in rec.events:
+        info = layers.get(fn)
+        if info is None:
+            node = rec.nodes[fn]
+            info = _event_info(node, pid, tid)
+            if isinstance(node, LayerNode):
+                layers[fn] = info
+        info = dict(info, ts=begin / 1000, dur=(end - begin) / 1000)
+        info["args"] = dict(info["args"])
+        yield info
+
+
+def write_trace(rec, f, pid=0, tid=0):
+    """Write the `trace_events` of ``rec`` into the text file-like object ``f``\ .
+
+    The events are written one at a time as a JSON object in the Chrome trace
+    format, which can be opened in ``chrome://tracing`` or Perfetto, so a
+    long trace is never held in memory as a whole. The trace has a span for
+    each module call; only recordings made with ``backend="dispatch"`` (see
+    `~torchrecorder.record`) also have a span for each op, since autograd does
+    not time the ops seen by the default backend.
+
+    Args:
+        rec (`~torchrecorder.recorder.Recorder`):
+        f:                  a text file-like object
+        pid (int, optional): process id of the events. Default ``0``.
+        tid (int, optional): thread id of the events. Default ``0``.
+
+    Returns:
+        `None`
+
+    """
+    f.write('{"displayTimeUnit": "ns", "traceEvents": [')
+    sep = "\n"
+    for event in trace_events(rec, pid, tid):
+        f.write(sep)
+        f.write(json.dumps(event))
+        sep = ",\n"
+    f.write("\n]}\n")
+
+
+def _event_info(node, pid, tid):
+    """The fields of the trace events of ``node``\ , other than the times."""
+    if isinstance(node.fn, FnSummary):
+        typename = node.fn.typename
+    else:
+        typename = type(node.fn).__name__
+    info = dict(name=node.name.split("\n")[0], cat="op", ph="X", pid=pid, tid=tid)
+    info["args"] = dict(type=typename)
+    if isinstance(node, LayerNode):
+        info["cat"] = "module"
+        info["args"]["qualname"] = node.qualname
+    return info